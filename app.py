@@ -1,6 +1,6 @@
 import streamlit as st
 from utils.config_loader import load_markets, load_graham_criteria, get_market_code
-from ui.ui_components import create_sidebar, display_results, display_how_to
+from ui.ui_components import create_sidebar, create_saved_screens_panel, display_results, display_filter_funnel, display_screen_events, display_sql_query, display_how_to
 from core.screener import run_screener_with_logs
 from utils.logger import get_log_html
 from data_processing.update_market import update_single_market
@@ -62,7 +62,7 @@ def main():
     st.markdown('<p class="sub-header">Value investing based on Benjamin Graham\'s principles</p>', unsafe_allow_html=True)
     
     # Create tabs
-    tab1, tab2 = st.tabs(["Screener", "How To"])
+    tab1, tab2, tab3 = st.tabs(["Screener", "SQL Query", "How To"])
 
     with tab1:
         # Load configurations
@@ -71,12 +71,15 @@ def main():
         
         # Create sidebar
         selected_market, filters, update_market_button_clicked = create_sidebar(markets, graham_criteria)
+        create_saved_screens_panel(get_market_code(selected_market), filters)
         
 
         if 'screening_active' not in st.session_state:
             st.session_state.screening_active = False
         if 'results_df' not in st.session_state:
             st.session_state.results_df = None
+        if 'results_version' not in st.session_state:
+            st.session_state.results_version = 0
         if 'log_messages' not in st.session_state:
             st.session_state.log_messages = []
         if 'market_update_logs' not in st.session_state:
@@ -152,6 +155,7 @@ def main():
                     results_df = run_screener_with_logs(selected_market, filters, st.session_state.log_messages, log_placeholder)
                     if results_df is not None:
                         st.session_state.results_df = results_df
+                        st.session_state.results_version += 1
                     st.session_state.screening_active = False
                     st.rerun()
             except Exception as e:
@@ -161,9 +165,15 @@ def main():
         # Display results if available and screening is not active
         if not st.session_state.screening_active and st.session_state.results_df is not None:
             with results_placeholder.container():
-                display_results(st.session_state.results_df, selected_market)
+                display_results(st.session_state.results_df, selected_market, st.session_state.results_version)
+                display_filter_funnel(get_market_code(selected_market), filters, graham_criteria, expanded=st.session_state.results_df.empty)
+        
+        display_screen_events()
 
     with tab2:
+        display_sql_query()
+
+    with tab3:
         display_how_to()
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+import pandas as pd
+from typing import Dict, Any, Callable, Optional
+from data_processing.fx import usd_column
+
+def _column(name: str) -> Callable[[pd.DataFrame], Optional[pd.Series]]:
+    return lambda df: df[name] if name in df.columns else None
+
+def _as_is(value):
+    return value
+
+def _percent(value):
+    return value / 100
+
+def _millions(value):
+    return value * 1e6
+
+# filter key -> (values to compare, 'max' or 'min', slider value -> threshold, slider value that turns it off)
+# History filters are off at 0 so stocks without cached history are not dropped by default.
+# Relative filters are percentiles (0-100) within the stock's sector across all processed markets.
+CUSTOM_CRITERIA = {
+    'pe_max': (_column('PE'), 'max', _as_is, None),
+    'pb_max': (_column('PB'), 'max', _as_is, None),
+    'pe_pb_max': (lambda df: df['PE'] * df['PB'], 'max', _as_is, None),
+    'debt_to_equity_max': (_column('DebtToEquity'), 'max', _as_is, None),
+    'current_ratio_min': (_column('CurrentRatio'), 'min', _as_is, None),
+    'dividend_yield_min': (_column('DividendYield'), 'min', _percent, None),
+    'eps_min': (_column('EPS'), 'min', _as_is, None),
+    'market_cap_min': (lambda df: usd_column(df, 'MarketCap'), 'min', _millions, None),
+    'earnings_years_min': (_column('YearsPositiveEarnings'), 'min', _as_is, 0),
+    'dividend_years_min': (_column('YearsDividends'), 'min', _as_is, 0),
+    'earnings_growth_min': (_column('EarningsGrowth'), 'min', _percent, 0),
+    'pe_sector_pct_max': (_column('PE_SectorPct'), 'max', _percent, 100),
+    'pb_sector_pct_max': (_column('PB_SectorPct'), 'max', _percent, 100),
+    'dividend_yield_sector_pct_min': (_column('DividendYield_SectorPct'), 'min', _percent, 0),
+}
+RELATIVE_FILTERS = ('pe_sector_pct_max', 'pb_sector_pct_max', 'dividend_yield_sector_pct_min')
+
+def criterion_mask(df: pd.DataFrame, key: str, value: Any) -> Optional[pd.Series]:
+    """Rows of df that pass one custom criterion, or None if the criterion is off or its column is missing"""
+    values_for, kind, to_threshold, off = CUSTOM_CRITERIA[key]
+    if value is None or value == off:
+        return None
+    values = values_for(df)
+    if values is None:
+        return None
+    threshold = to_threshold(value)
+    return values <= threshold if kind == 'max' else values >= threshold
+
+def apply_custom_filters(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
+    mask = pd.Series([True] * len(df), index=df.index)
+    
+    for key in CUSTOM_CRITERIA:
+        criterion = criterion_mask(df, key, filters.get(key))
+        if criterion is not None:
+            mask &= criterion
+    
+    return df[mask]
+
+def is_active(filters: Dict[str, Any], key: str) -> bool:
+    value = filters.get(key)
+    return value is not None and value != CUSTOM_CRITERIA[key][3]
+
+def uses_history_filters(filters: Dict[str, Any]) -> bool:
+    return bool(filters) and any(filters.get(k) for k in ('earnings_years_min', 'dividend_years_min', 'earnings_growth_min'))
+
+def uses_relative_filters(filters: Dict[str, Any]) -> bool:
+    """Whether a filter set depends on sector percentiles, which move when any peer is refreshed"""
+    return bool(filters) and any(is_active(filters, k) for k in RELATIVE_FILTERS)
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from core.screen import filter as graham_filter
+from core.criteria import CUSTOM_CRITERIA, criterion_mask
+from core.relative import attach_relative_metrics
+
+GRAHAM_BASE = 'graham_base'
+
+# Set bits per byte value, so counting a packed bitset is one table lookup per 8 rows
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _pack(mask) -> np.ndarray:
+    return np.packbits(np.asarray(mask, dtype=bool))
+
+def _count(bits: np.ndarray) -> int:
+    return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+def load_screening_snapshot(market: str) -> pd.DataFrame:
+    """The processed snapshot of a market with every column the custom criteria can use"""
+    df = pd.read_csv(f"data/processed/{market}_tickers.csv", dtype={'Ticker': str})
+    return attach_relative_metrics(df, market).reset_index(drop=True)
+
+def compute_bitsets(df: pd.DataFrame, filters: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """One packed bitset per active criterion, in screening order, starting with the fixed Graham filter"""
+    bitsets = {GRAHAM_BASE: _pack(df.index.isin(graham_filter(df).index))}
+    for key in CUSTOM_CRITERIA:
+        mask = criterion_mask(df, key, filters.get(key))
+        if mask is not None:
+            bitsets[key] = _pack(mask.to_numpy(dtype=bool, na_value=False))
+    return bitsets
+
+def _all_rows(row_count: int) -> np.ndarray:
+    return _pack(np.ones(row_count, dtype=bool))
+
+def _others(bitsets: Dict[str, np.ndarray], row_count: int) -> Dict[str, np.ndarray]:
+    """AND of every bitset except one, for each key, from prefix and suffix products"""
+    keys = list(bitsets)
+    prefix = [_all_rows(row_count)]
+    for key in keys:
+        prefix.append(prefix[-1] & bitsets[key])
+    suffix = [_all_rows(row_count)]
+    for key in reversed(keys):
+        suffix.append(suffix[-1] & bitsets[key])
+    suffix.reverse()
+    return {key: prefix[i] & suffix[i + 1] for i, key in enumerate(keys)}
+
+def funnel_report(df: pd.DataFrame, filters: Dict[str, Any], bitsets: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Per criterion: rows failing it, rows left after it in screening order, and matches if it were dropped"""
+    row_count = len(df)
+    others = _others(bitsets, row_count)
+
+    rows = []
+    remaining = _all_rows(row_count)
+    for key, bits in bitsets.items():
+        remaining = remaining & bits
+        rows.append({
+            'Criterion': key,
+            'Value': None if key == GRAHAM_BASE else filters.get(key),
+            'Fails': row_count - _count(bits),
+            'RemainingAfter': _count(remaining),
+            'MatchesIfDropped': _count(others[key]),
+        })
+    return pd.DataFrame(rows)
+
+def _sweep_values(spec: Dict[str, float]) -> np.ndarray:
+    return np.round(np.arange(spec['min'], spec['max'] + spec['step'] / 2, spec['step']), 6)
+
+def sensitivity_grid(df: pd.DataFrame, bitsets: Dict[str, np.ndarray], ranges: Dict[str, Dict[str, float]],
+                     keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """Match count for every slider value in ranges, with all other criteria held at their current values
+
+    bitsets comes from compute_bitsets and is shared with funnel_report, so no criterion is evaluated twice.
+    """
+    row_count = len(df)
+    others = _others(bitsets, row_count)
+    everything = _all_rows(row_count)
+    for bits in bitsets.values():
+        everything = everything & bits
+
+    rows = []
+    for key in keys or [k for k in ranges if k in CUSTOM_CRITERIA]:
+        # A criterion that is currently off is not in bitsets, so the rest of the screen is all of them
+        rest = others.get(key, everything)
+        values_for, kind, to_threshold, off = CUSTOM_CRITERIA[key]
+        column = values_for(df)
+        column = None if column is None else column.to_numpy(dtype=float, na_value=np.nan)
+        for value in _sweep_values(ranges[key]):
+            if column is None or value == off:
+                bits = _all_rows(row_count)
+            else:
+                threshold = to_threshold(float(value))
+                bits = _pack(column <= threshold if kind == 'max' else column >= threshold)
+            rows.append({'Criterion': key, 'Value': float(value), 'Matches': _count(rest & bits)})
+    return pd.DataFrame(rows, columns=['Criterion', 'Value', 'Matches'])
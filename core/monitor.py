@@ -0,0 +1,215 @@
+import os
+import json
+import threading
+from collections import deque
+import requests
+import pandas as pd
+from typing import Dict, Any, List, Optional
+from core.screen import filter as graham_filter
+from core.criteria import apply_custom_filters, uses_relative_filters
+from core.relative import attach_relative_metrics, snapshot_version
+
+WATCH_DIR = "data/watch"
+SCREENS_PATH = os.path.join(WATCH_DIR, "screens.json")
+MEMBERSHIP_PATH = os.path.join(WATCH_DIR, "membership.json")
+EVENTS_PATH = os.path.join(WATCH_DIR, "events.jsonl")
+# Snapshot version each screen with sector-percentile filters was last fully evaluated against
+RELATIVE_VERSIONS_PATH = os.path.join(WATCH_DIR, "relative_versions.json")
+FINGERPRINT_DIR = os.path.join(WATCH_DIR, "fingerprints")
+
+# Columns that change on every fetch without the underlying data changing
+_VOLATILE_COLUMNS = ["LastUpdated"]
+
+_lock = threading.Lock()
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def _write_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_screens() -> Dict[str, Dict[str, Any]]:
+    return _read_json(SCREENS_PATH, {})
+
+def _matches(df: pd.DataFrame, screen: Dict[str, Any]) -> pd.Index:
+    """Tickers of df that pass the Graham filter and the screen's own filters"""
+    if df.empty:
+        return pd.Index([])
+    if screen.get("watchlist"):
+        df = df[df["Ticker"].astype(str).isin(screen["watchlist"])]
+    passed = apply_custom_filters(graham_filter(df), screen.get("filters", {}))
+    return pd.Index(passed["Ticker"].astype(str))
+
+def _fingerprints(df: pd.DataFrame) -> pd.Series:
+    stable = df.drop(columns=[c for c in _VOLATILE_COLUMNS if c in df.columns])
+    hashes = pd.util.hash_pandas_object(stable, index=False)
+    return pd.Series(hashes.values, index=df["Ticker"].astype(str).values)
+
+def _load_snapshot(market: str) -> pd.DataFrame:
+    path = f"data/processed/{market}_tickers.csv"
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["Ticker"])
+    return pd.read_csv(path, dtype={'Ticker': str})
+
+def save_screen(name: str, market: str, filters: Dict[str, Any], watchlist: Optional[List[str]] = None,
+                webhook: Optional[str] = None) -> int:
+    """Save a screen and record its current members as the baseline. Returns the member count"""
+    screen = {
+        "market": market,
+        "filters": filters,
+        "watchlist": [t.strip() for t in watchlist if t.strip()] if watchlist else None,
+        "webhook": webhook or None,
+    }
+    # Later refreshes only re-check changed rows, unless the screen uses sector-percentile filters
+    snapshot = _load_snapshot(market)
+    version = snapshot_version()
+    members = _matches(attach_relative_metrics(snapshot, market), screen)
+    with _lock:
+        # Later refreshes of this market are diffed against the rows the baseline was taken from
+        _update_fingerprints(market, snapshot)
+        screens = load_screens()
+        screens[name] = screen
+        _write_json(SCREENS_PATH, screens)
+        membership = _read_json(MEMBERSHIP_PATH, {})
+        membership[name] = sorted(members)
+        _write_json(MEMBERSHIP_PATH, membership)
+        versions = _read_json(RELATIVE_VERSIONS_PATH, {})
+        versions[name] = version
+        _write_json(RELATIVE_VERSIONS_PATH, versions)
+    return len(members)
+
+def delete_screen(name: str):
+    with _lock:
+        screens = load_screens()
+        screens.pop(name, None)
+        _write_json(SCREENS_PATH, screens)
+        membership = _read_json(MEMBERSHIP_PATH, {})
+        membership.pop(name, None)
+        _write_json(MEMBERSHIP_PATH, membership)
+        versions = _read_json(RELATIVE_VERSIONS_PATH, {})
+        versions.pop(name, None)
+        _write_json(RELATIVE_VERSIONS_PATH, versions)
+
+def _emit(events: List[Dict[str, Any]], screens: Dict[str, Dict[str, Any]]):
+    os.makedirs(WATCH_DIR, exist_ok=True)
+    with open(EVENTS_PATH, "a", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+    by_webhook = {}
+    for event in events:
+        webhook = screens[event["screen"]].get("webhook")
+        if webhook:
+            by_webhook.setdefault(webhook, []).append(event)
+    for webhook, payload in by_webhook.items():
+        try:
+            if webhook.startswith("file://"):
+                # Local stand-in for a webhook receiver
+                with open(webhook[len("file://"):], "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"events": payload}) + "\n")
+            else:
+                requests.post(webhook, json={"events": payload}, timeout=10).raise_for_status()
+        except Exception as e:
+            print(f"[ERROR] Webhook {webhook}: {type(e).__name__} - {e}")
+
+def _event(timestamp: str, screen_name: str, market: str, ticker: str, name: Optional[str], kind: str) -> Dict[str, Any]:
+    return {"time": timestamp, "screen": screen_name, "market": market, "ticker": ticker, "name": name, "event": kind}
+
+def _names(rows: pd.DataFrame) -> Dict[str, str]:
+    return rows.set_index(rows["Ticker"].astype(str))["Name"].to_dict() if "Name" in rows.columns else {}
+
+def _update_fingerprints(market: str, snapshot: pd.DataFrame):
+    """Store the row fingerprints of a market's snapshot. Returns the (changed, removed) tickers since the last call"""
+    fingerprint_path = os.path.join(FINGERPRINT_DIR, f"{market}.parquet")
+    new = _fingerprints(snapshot)
+    new = new[~new.index.duplicated(keep="last")]
+    old = pd.read_parquet(fingerprint_path)["Hash"] if os.path.exists(fingerprint_path) else pd.Series(dtype="uint64")
+
+    known = new.index.isin(old.index)
+    previous = old.reindex(new.index, fill_value=0).values
+    changed = new.index[~known | (new.values != previous)]
+    removed = old.index.difference(new.index)
+    os.makedirs(FINGERPRINT_DIR, exist_ok=True)
+    pd.DataFrame({"Hash": new}).to_parquet(fingerprint_path)
+    return changed, removed
+
+def refresh_market(market: str, snapshot: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Re-check the screens affected by a freshly written snapshot and emit entered/left events
+
+    Screens on this market only re-check the rows that changed. Screens with sector-percentile
+    filters, on any market, are fully re-checked on every snapshot write: the snapshot version
+    changes with each write, and a refreshed peer can move every percentile without touching
+    their own rows.
+    """
+    with _lock:
+        screens = load_screens()
+        if not screens:
+            return []
+        version = snapshot_version()
+        versions = _read_json(RELATIVE_VERSIONS_PATH, {})
+        stale = {name for name, s in screens.items()
+                 if uses_relative_filters(s.get("filters", {})) and versions.get(name) != version}
+        on_market = {name for name, s in screens.items() if s.get("market") == market}
+        if not stale and not on_market:
+            return []
+
+        changed = removed = pd.Index([])
+        if on_market:
+            changed, removed = _update_fingerprints(market, snapshot)
+        incremental = on_market - stale
+        if not stale and (changed.empty and removed.empty):
+            return []
+
+        membership = _read_json(MEMBERSHIP_PATH, {})
+        timestamp = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
+        events = []
+
+        if incremental and not (changed.empty and removed.empty):
+            rows = attach_relative_metrics(snapshot[snapshot["Ticker"].astype(str).isin(changed)], market)
+            names = _names(rows)
+            changed_set, removed_set = set(changed), set(removed)
+            for screen_name in sorted(incremental):
+                members = set(membership.get(screen_name, []))
+                passing = set(_matches(rows, screens[screen_name]))
+                entered = passing - members
+                left = (members & (changed_set - passing)) | (members & removed_set)
+                events += [_event(timestamp, screen_name, market, t, names.get(t), "entered") for t in sorted(entered)]
+                events += [_event(timestamp, screen_name, market, t, names.get(t), "left") for t in sorted(left)]
+                membership[screen_name] = sorted((members | entered) - left)
+
+        full_rows = {}
+        for screen_name in sorted(stale):
+            screen_market = screens[screen_name].get("market")
+            if screen_market not in full_rows:
+                rows = snapshot if screen_market == market else _load_snapshot(screen_market)
+                full_rows[screen_market] = attach_relative_metrics(rows, screen_market)
+            rows = full_rows[screen_market]
+            names = _names(rows)
+            members = set(membership.get(screen_name, []))
+            passing = set(_matches(rows, screens[screen_name]))
+            events += [_event(timestamp, screen_name, screen_market, t, names.get(t), "entered") for t in sorted(passing - members)]
+            events += [_event(timestamp, screen_name, screen_market, t, names.get(t), "left") for t in sorted(members - passing)]
+            membership[screen_name] = sorted(passing)
+            versions[screen_name] = version
+
+        _write_json(MEMBERSHIP_PATH, membership)
+        if stale:
+            _write_json(RELATIVE_VERSIONS_PATH, versions)
+        if events:
+            _emit(events, screens)
+        return events
+
+def recent_events(limit: int = 50) -> List[Dict[str, Any]]:
+    if not os.path.exists(EVENTS_PATH):
+        return []
+    with open(EVENTS_PATH, "r", encoding="utf-8") as f:
+        lines = deque(f, maxlen=limit)
+    return [json.loads(line) for line in reversed(lines)]
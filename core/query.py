@@ -0,0 +1,76 @@
+import os
+import glob
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+PROCESSED_DIR = "data/processed"
+SNAPSHOT_SUFFIX = "_tickers"
+
+EXAMPLE_QUERY = """SELECT Market, Ticker, Name, 1 / PE AS EarningsYield, DebtToEquity
+FROM stocks
+WHERE PE > 0 AND DebtToEquity < 0.3
+QUALIFY row_number() OVER (PARTITION BY Market ORDER BY EarningsYield DESC) <= 50
+ORDER BY Market, EarningsYield DESC"""
+
+def sync_parquet_snapshots(processed_dir: str = PROCESSED_DIR) -> int:
+    """Write a Parquet copy of any CSV snapshot that has none or an older one"""
+    converted = 0
+    for csv_path in glob.glob(os.path.join(processed_dir, f"*{SNAPSHOT_SUFFIX}.csv")):
+        parquet_path = csv_path[:-len(".csv")] + ".parquet"
+        if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(csv_path):
+            pd.read_csv(csv_path, dtype={'Ticker': str}).to_parquet(parquet_path, index=False)
+            converted += 1
+    return converted
+
+def _connect(processed_dir: str = PROCESSED_DIR) -> duckdb.DuckDBPyConnection:
+    # A fresh in-memory connection per query: user SQL can never alter the view another query relies on
+    conn = duckdb.connect(database=":memory:")
+    conn.execute(f"SET threads TO {os.cpu_count() or 1}")
+    # Column filters are pushed down into the Parquet scan and files are read in parallel
+    snapshot_dir = os.path.abspath(processed_dir)
+    snapshot_glob = os.path.join(snapshot_dir, f"*{SNAPSHOT_SUFFIX}.parquet").replace("'", "''")
+    conn.execute(f"""
+        CREATE VIEW stocks AS
+        SELECT * EXCLUDE (filename),
+               regexp_extract(filename, '([^/\\\\]+){SNAPSHOT_SUFFIX}\\.parquet$', 1) AS Market
+        FROM read_parquet('{snapshot_glob}', filename = true, union_by_name = true)
+    """)
+    # Queries may only read the snapshots: no other files, no extensions, no changing these settings back
+    allowed = os.path.join(snapshot_dir, "").replace("'", "''")
+    conn.execute(f"SET allowed_directories = ['{allowed}']")
+    conn.execute("SET enable_external_access = false")
+    conn.execute("SET lock_configuration = true")
+    return conn
+
+def _single_select(sql: str) -> str:
+    try:
+        statements = duckdb.extract_statements(sql)
+    except duckdb.Error as e:
+        raise ValueError(f"Could not parse query: {e}") from e
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError("Only a single read-only SELECT query is allowed.")
+    return statements[0].query
+
+def run_query_arrow(sql: str, processed_dir: str = PROCESSED_DIR) -> pa.Table:
+    """Run a read-only SQL query over every processed market snapshot and return an Arrow table.
+
+    All snapshots are exposed as one table called `stocks` with an extra `Market` column.
+    """
+    query = _single_select(sql)
+
+    sync_parquet_snapshots(processed_dir)
+    if not glob.glob(os.path.join(processed_dir, f"*{SNAPSHOT_SUFFIX}.parquet")):
+        raise ValueError("No processed market snapshots found. Run the screener on at least one market first.")
+
+    conn = _connect(processed_dir)
+    try:
+        result = conn.execute(query).arrow()
+        # Newer duckdb releases return a RecordBatchReader here instead of a Table
+        return result.read_all() if isinstance(result, pa.RecordBatchReader) else result
+    finally:
+        conn.close()
+
+def run_query(sql: str, processed_dir: str = PROCESSED_DIR) -> pd.DataFrame:
+    """Same as run_query_arrow, returned as a pandas DataFrame"""
+    return run_query_arrow(sql, processed_dir).to_pandas()
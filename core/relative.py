@@ -0,0 +1,112 @@
+import os
+import glob
+import hashlib
+import threading
+import pandas as pd
+from typing import Dict, List
+from data_processing.fx import MONETARY_COLUMNS, usd_column
+from core.query import PROCESSED_DIR, SNAPSHOT_SUFFIX, sync_parquet_snapshots
+
+RELATIVE_METRICS = ["PE", "PB", "EPS", "DividendYield", "DebtToEquity", "CurrentRatio", "MarketCap"]
+# Valuation ratios are only comparable when positive; a negative P/E is not "cheap"
+POSITIVE_ONLY = {"PE", "PB"}
+RELATIVE_GROUPS = {"Sector": "Sector", "Market": "Market"}
+RELATIVE_CACHE_DIR = os.path.join(PROCESSED_DIR, "relative")
+
+_cache: Dict[str, pd.DataFrame] = {}
+_cache_lock = threading.Lock()
+
+def relative_columns() -> List[str]:
+    return [f"{m}_{g}{kind}" for g in RELATIVE_GROUPS for m in RELATIVE_METRICS for kind in ("Pct", "Z")]
+
+def snapshot_version(processed_dir: str = PROCESSED_DIR) -> str:
+    """Fingerprint of the processed snapshots; it changes whenever any market is refreshed"""
+    sync_parquet_snapshots(processed_dir)
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(processed_dir, f"*{SNAPSHOT_SUFFIX}.parquet"))):
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()[:16]
+
+def load_global_snapshot(processed_dir: str = PROCESSED_DIR) -> pd.DataFrame:
+    frames = []
+    for path in sorted(glob.glob(os.path.join(processed_dir, f"*{SNAPSHOT_SUFFIX}.parquet"))):
+        df = pd.read_parquet(path)
+        df["Market"] = os.path.basename(path)[:-len(f"{SNAPSHOT_SUFFIX}.parquet")]
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["Market", "Ticker"] + RELATIVE_METRICS)
+    return pd.concat(frames, ignore_index=True)
+
+def _group_pass(df: pd.DataFrame, key: str, suffix: str) -> pd.DataFrame:
+    """Percentile rank and z-score of every metric within each group, in one groupby"""
+    values = df[RELATIVE_METRICS].apply(pd.to_numeric, errors="coerce")
+    for metric in POSITIVE_ONLY:
+        values[metric] = values[metric].where(values[metric] > 0)
+
+    if df[key].notna().sum() == 0:
+        # groupby over an all-null key has no groups to align back onto the rows
+        empty = pd.DataFrame(float("nan"), index=df.index, columns=RELATIVE_METRICS)
+        pct, z = empty, empty.copy()
+    else:
+        grouped = values.groupby(df[key], dropna=True)
+        pct = grouped.rank(pct=True)
+        mean = grouped.transform("mean")
+        std = grouped.transform("std")
+        z = (values - mean) / std.where(std > 0)
+
+    pct.columns = [f"{m}_{suffix}Pct" for m in RELATIVE_METRICS]
+    z.columns = [f"{m}_{suffix}Z" for m in RELATIVE_METRICS]
+    return pd.concat([pct, z], axis=1)
+
+def compute_relative_metrics(snapshot: pd.DataFrame) -> pd.DataFrame:
+    """Sector- and market-relative ranks for the whole global snapshot, indexed by (Market, Ticker)"""
+    df = snapshot.copy()
+    for column in ["Sector", "SourceTicker"] + RELATIVE_METRICS:
+        if column not in df.columns:
+            df[column] = None
+    df["Ticker"] = df["Ticker"].astype(str)
+    df = df.drop_duplicates(["Market", "Ticker"])
+    # Monetary metrics are only comparable across markets in one currency
+    for column in [c for c in MONETARY_COLUMNS if c in df.columns]:
+        df[column] = usd_column(df, column)
+    df["SourceTicker"] = df["SourceTicker"].fillna(df["Ticker"])
+
+    # Cross-listings of one issuer would otherwise be counted several times in its sector
+    issuers = df.drop_duplicates("SourceTicker")
+    sector = _group_pass(issuers, "Sector", "Sector").set_axis(issuers["SourceTicker"].values)
+    market = _group_pass(df, "Market", "Market")
+
+    result = pd.concat([sector.reindex(df["SourceTicker"].values).set_axis(df.index), market], axis=1)
+    result.index = pd.MultiIndex.from_frame(df[["Market", "Ticker"]])
+    return result[relative_columns()]
+
+def get_relative_metrics(processed_dir: str = PROCESSED_DIR) -> pd.DataFrame:
+    """Relative metrics for the current snapshot version, computed at most once per version"""
+    version = snapshot_version(processed_dir)
+    with _cache_lock:
+        if version in _cache:
+            return _cache[version]
+
+        cache_path = os.path.join(RELATIVE_CACHE_DIR, f"relative_{version}.parquet")
+        if os.path.exists(cache_path):
+            metrics = pd.read_parquet(cache_path)
+        else:
+            metrics = compute_relative_metrics(load_global_snapshot(processed_dir))
+            os.makedirs(RELATIVE_CACHE_DIR, exist_ok=True)
+            for stale in glob.glob(os.path.join(RELATIVE_CACHE_DIR, "relative_*.parquet")):
+                os.remove(stale)
+            metrics.to_parquet(cache_path)
+
+        _cache.clear()
+        _cache[version] = metrics
+        return metrics
+
+def attach_relative_metrics(df: pd.DataFrame, market: str, processed_dir: str = PROCESSED_DIR) -> pd.DataFrame:
+    """Add the cached relative columns to rows of one market"""
+    if df.empty:
+        return df
+    metrics = get_relative_metrics(processed_dir)
+    keys = pd.MultiIndex.from_arrays([[market] * len(df), df["Ticker"].astype(str)])
+    df = df.drop(columns=[c for c in relative_columns() if c in df.columns])
+    return pd.concat([df, metrics.reindex(keys).set_axis(df.index)], axis=1)
@@ -1,4 +1,5 @@
 import pandas as pd
+from data_processing.fx import usd_column
 
 def filter(df):
     return df[
@@ -9,7 +10,7 @@ def filter(df):
         (df["CurrentRatio"] > 1.5) &               
         (df["DividendYield"] > 0.02) &             
         (df["EPS"] > 0) &                          
-        (df["MarketCap"] > 500_000_000)            
+        (usd_column(df, "MarketCap") > 500_000_000)
     ]
 
 def apply_filter(file_path, market):
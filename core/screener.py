@@ -1,7 +1,11 @@
 import pandas as pd
-from typing import Dict, Any, Callable
-from data_processing.processer import process_data
+from typing import Dict, Any
+from data_processing.processer import process_data, save_snapshot
+from data_processing.history import attach_history_metrics
 from core.screen import apply_filter
+from core.relative import attach_relative_metrics
+from core.criteria import apply_custom_filters, uses_history_filters
+from core.monitor import refresh_market
 from utils.config_loader import get_market_code
 from utils.logger import streamlit_log_redirect, log_message, log_ticker_progress, log_ticker_loading_complete
 
@@ -25,11 +29,27 @@ def run_screener_with_logs(selected_market: str, filters: Dict[str, Any], log_me
             result_df = process_data(ticker_file, market_code, progress_callback)
             processed_count = len(result_df)
             
+            # Cached history is always attached; missing history is only downloaded when a history filter is on
+            needs_history = uses_history_filters(filters)
+            if needs_history:
+                log_message(log_messages, log_placeholder, "Loading earnings and dividend history (cached tickers are skipped)...")
+            
+            def history_callback(ticker, current=None, total=None):
+                log_ticker_progress(log_messages, log_placeholder, f"{ticker} history", None, current, total)
+            
+            result_df = attach_history_metrics(result_df, ingest=needs_history, log_callback=history_callback)
+            # Written once, with history, so saved screens and relative ranks see a single new version
+            save_snapshot(result_df, market_code)
+            refresh_market(market_code, result_df)
+            
             log_message(log_messages, log_placeholder, f"Applying Graham's value investing filters...")
             processed_file = f'data/processed/{market_code}_tickers.csv'
             filtered_df = apply_filter(processed_file, market_code)
             log_message(log_messages, log_placeholder, f"Applied Graham filters - Found {len(filtered_df)} initial matches")
             
+            log_message(log_messages, log_placeholder, "Ranking against sector and market peers...")
+            filtered_df = attach_relative_metrics(filtered_df, market_code)
+            
             if filters:
                 log_message(log_messages, log_placeholder, "Applying custom filter criteria...")
                 initial_count = len(filtered_df)
@@ -44,35 +64,6 @@ def run_screener_with_logs(selected_market: str, filters: Dict[str, Any], log_me
         log_message(log_messages, log_placeholder, f"Error during screening: {str(e)}")
         raise e
 
-def apply_custom_filters(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
-    mask = pd.Series([True] * len(df), index=df.index)
-    
-    if filters.get('pe_max') is not None:
-        mask &= (df['PE'] <= filters['pe_max'])
-    
-    if filters.get('pb_max') is not None:
-        mask &= (df['PB'] <= filters['pb_max'])
-    
-    if filters.get('pe_pb_max') is not None:
-        mask &= ((df['PE'] * df['PB']) <= filters['pe_pb_max'])
-    
-    if filters.get('debt_to_equity_max') is not None:
-        mask &= (df['DebtToEquity'] <= filters['debt_to_equity_max'])
-    
-    if filters.get('current_ratio_min') is not None:
-        mask &= (df['CurrentRatio'] >= filters['current_ratio_min'])
-    
-    if filters.get('dividend_yield_min') is not None:
-        mask &= (df['DividendYield'] >= filters['dividend_yield_min'] / 100)
-    
-    if filters.get('eps_min') is not None:
-        mask &= (df['EPS'] >= filters['eps_min'])
-    
-    if filters.get('market_cap_min') is not None:
-        mask &= (df['MarketCap'] >= filters['market_cap_min'] * 1e6)
-    
-    return df[mask]
-
 def format_results_for_display(df: pd.DataFrame) -> pd.DataFrame:
     display_df = df.copy()
     
@@ -88,6 +79,18 @@ def format_results_for_display(df: pd.DataFrame) -> pd.DataFrame:
         display_df['DebtToEquity'] = display_df['DebtToEquity'].round(2)
     if 'MarketCap' in display_df.columns:
         display_df['MarketCap'] = (display_df['MarketCap'] / 1e9).round(2)
+    if 'MarketCapUSD' in display_df.columns:
+        display_df['MarketCapUSD'] = (display_df['MarketCapUSD'] / 1e9).round(2)
+    display_df = display_df.drop(columns=[c for c in ('PriceUSD', 'EPSUSD', 'FxRateUSD') if c in display_df.columns])
+    if 'EarningsGrowth' in display_df.columns:
+        display_df['EarningsGrowth'] = (display_df['EarningsGrowth'] * 100).round(1)
+    
+    relative = [c for c in display_df.columns if c.endswith(('_SectorPct', '_MarketPct', '_SectorZ', '_MarketZ'))]
+    shown = ['PE_SectorPct', 'PB_SectorPct', 'DividendYield_SectorPct', 'PE_MarketPct']
+    display_df = display_df.drop(columns=[c for c in relative if c not in shown])
+    for column in shown:
+        if column in display_df.columns:
+            display_df[column] = (display_df[column] * 100).round(1)
     
     column_mapping = {
         'Ticker': 'Symbol',
@@ -100,7 +103,19 @@ def format_results_for_display(df: pd.DataFrame) -> pd.DataFrame:
         'DebtToEquity': 'Debt/Equity',
         'CurrentRatio': 'Current Ratio',
         'MarketCap': 'Market Cap (B)',
-        'LastUpdated': 'Last Updated'
+        'MarketCapUSD': 'Market Cap (B USD)',
+        'LastUpdated': 'Last Updated',
+        'YearsPositiveEarnings': 'Years of Positive Earnings',
+        'YearsDividends': 'Years of Dividends',
+        'EarningsGrowth': 'EPS Growth (%)',
+        'Sector': 'Sector',
+        'Currency': 'Currency',
+        'FinancialCurrency': 'Reporting Currency',
+        'PE_SectorPct': 'P/E Sector Percentile',
+        'PB_SectorPct': 'P/B Sector Percentile',
+        'DividendYield_SectorPct': 'Dividend Yield Sector Percentile',
+        'PE_MarketPct': 'P/E Market Percentile',
+        'SourceTicker': 'Data Source'
     }
     
     return display_df.rename(columns=column_mapping) 
\ No newline at end of file
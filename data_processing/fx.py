@@ -0,0 +1,120 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+FX_RATES_PATH = "data/configs/fx_rates.json"
+MONETARY_COLUMNS = ["Price", "EPS", "MarketCap"]
+
+# Yahoo quotes Price in the listing's currency, which can be a subunit (GBp, ZAc, ILA), but
+# MarketCap in the major unit of that currency and EPS in the issuer's reporting currency
+# (financialCurrency). Each column is converted with the rate of the unit it is actually in.
+_PRICE_COLUMNS = ["Price"]
+_MAJOR_UNIT_COLUMNS = ["MarketCap"]
+_REPORTING_COLUMNS = ["EPS"]
+
+_cache = {}
+_cache_lock = threading.Lock()
+_warned = set()
+
+def _load_table(path: str):
+    mtime = os.path.getmtime(path)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+        rates = {code: float(rate) for code, rate in table["rates"].items()}
+        majors = {code: code for code in rates}
+        for code, subunit in table.get("subunits", {}).items():
+            if subunit["currency"] in rates:
+                rates[code] = rates[subunit["currency"]] * float(subunit["factor"])
+                majors[code] = subunit["currency"]
+
+        series = pd.Series(rates, dtype=float)
+        _cache[path] = (mtime, series, majors)
+        return series, majors
+
+def load_fx_rates(path: str = FX_RATES_PATH) -> pd.Series:
+    """USD per unit for every currency code in the FX table, subunits included. Reloaded only when the file changes"""
+    return _load_table(path)[0]
+
+def major_currency(codes: pd.Series, path: str = FX_RATES_PATH) -> pd.Series:
+    """The major unit of each currency code (GBp -> GBP); codes that are not subunits map to themselves"""
+    majors = _load_table(path)[1]
+    return codes.map(lambda code: majors.get(code, code), na_action="ignore")
+
+def _usd_factor(currency: pd.Series, rates: pd.Series) -> pd.Series:
+    """USD per unit for each row, with one rate lookup per currency group"""
+    codes, currencies = pd.factorize(currency)
+    # Trailing NaN so rows without a currency (code -1) get no rate
+    group_rates = np.append(rates.reindex(currencies).to_numpy(), np.nan)
+    return pd.Series(group_rates[codes], index=currency.index)
+
+def normalize_currency(df: pd.DataFrame, path: str = FX_RATES_PATH) -> pd.DataFrame:
+    """Add <column>USD for every monetary column, each converted from the unit Yahoo reports it in"""
+    if df.empty:
+        return df
+    df = df.copy()
+    missing = pd.Series(None, index=df.index, dtype=object)
+    currency = df["Currency"] if "Currency" in df.columns else missing
+    reporting = df["FinancialCurrency"] if "FinancialCurrency" in df.columns else missing
+
+    rates = load_fx_rates(path)
+    major = major_currency(currency, path)
+    # Snapshots fetched before FinancialCurrency was recorded fall back to the trading currency
+    reporting = reporting.fillna(major)
+    units = {
+        **{column: currency for column in _PRICE_COLUMNS},
+        **{column: major for column in _MAJOR_UNIT_COLUMNS},
+        **{column: reporting for column in _REPORTING_COLUMNS},
+    }
+
+    unknown = sorted(set(pd.concat([currency, reporting]).dropna()) - set(rates.index))
+    if unknown:
+        print(f"[WARNING] No FX rate for {', '.join(unknown)} in {path}; USD columns left empty for those rows")
+
+    factor = _usd_factor(currency, rates)
+    # Rows with no currency at all are handled by usd_column; these have a code but no rate
+    unconverted = int((factor.isna() & currency.notna()).sum())
+    if unconverted:
+        print(f"[WARNING] {unconverted} rows have no FX rate and are excluded from USD-based filters")
+
+    df["FxRateUSD"] = factor
+    for column in MONETARY_COLUMNS:
+        if column in df.columns:
+            unit_factor = factor if units[column] is currency else _usd_factor(units[column], rates)
+            df[f"{column}USD"] = pd.to_numeric(df[column], errors="coerce") * unit_factor
+    return df
+
+def _warn_once(message: str):
+    with _cache_lock:
+        if message in _warned:
+            return
+        _warned.add(message)
+    print(message)
+
+def usd_column(df: pd.DataFrame, column: str) -> pd.Series:
+    """The USD version of a monetary column; NaN where a known currency has no rate
+
+    Rows with no recorded currency come from snapshots saved before currencies were tracked. Their
+    values are used unconverted, as they were then, until the market is refreshed.
+    """
+    if df.empty:
+        return pd.Series(dtype=float, index=df.index)
+    if f"{column}USD" not in df.columns:
+        # Snapshots written before USD columns existed are converted on the fly
+        df = normalize_currency(df)
+    usd = df[f"{column}USD"]
+
+    legacy = df["Currency"].isna() if "Currency" in df.columns else pd.Series(True, index=df.index)
+    if legacy.any():
+        markets = sorted(df.loc[legacy, "Market"].dropna().unique()) if "Market" in df.columns else []
+        where = f" in {', '.join(markets)}" if markets else ""
+        _warn_once(f"[WARNING] Rows{where} have no recorded currency; their monetary values are used "
+                   "unconverted. Refresh these markets to convert them to USD")
+        usd = usd.where(~legacy, pd.to_numeric(df[column], errors="coerce"))
+    return usd
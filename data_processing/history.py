@@ -0,0 +1,198 @@
+import os
+import glob
+import pandas as pd
+import yfinance as yf
+
+# Columnar cache of per-ticker annual history. Each ingestion batch appends a part file,
+# so an interrupted run keeps what it already fetched. The manifest records the last year each
+# ticker is covered through, and a refresh only appends the years after it.
+HISTORY_DIR = "data/history"
+EARNINGS_DIR = os.path.join(HISTORY_DIR, "earnings")
+DIVIDENDS_DIR = os.path.join(HISTORY_DIR, "dividends")
+MANIFEST_DIR = os.path.join(HISTORY_DIR, "manifest")
+
+HISTORY_COLUMNS = ["YearsPositiveEarnings", "YearsDividends", "EarningsGrowth"]
+GROWTH_WINDOW_YEARS = 10
+_EPS_ROWS = ["Diluted EPS", "Basic EPS"]
+_MANIFEST_COLUMNS = ["Ticker", "FetchedAt", "EarningsThrough", "DividendsThrough"]
+# A ticker whose latest annual EPS is not out yet is asked again at most this often
+EARNINGS_RECHECK_DAYS = 30
+
+def _read_parts(directory, columns):
+    parts = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+
+def _write_part(df, directory, name):
+    os.makedirs(directory, exist_ok=True)
+    df.to_parquet(os.path.join(directory, f"{name}.parquet"), index=False)
+
+def _manifest():
+    """Latest manifest entry per ticker, indexed by Ticker"""
+    manifest = _read_parts(MANIFEST_DIR, _MANIFEST_COLUMNS).reindex(columns=_MANIFEST_COLUMNS)
+    manifest["FetchedAt"] = pd.to_datetime(manifest["FetchedAt"])
+    manifest = manifest.sort_values("FetchedAt", kind="stable").drop_duplicates("Ticker", keep="last").set_index("Ticker")
+    # Entries written before coverage was recorded hold dividends up to the year they were fetched in
+    manifest["DividendsThrough"] = manifest["DividendsThrough"].fillna(manifest["FetchedAt"].dt.year - 1)
+    return manifest
+
+def cached_tickers():
+    return set(_manifest().index)
+
+def _stale(manifest, now):
+    """Cached tickers that are missing a completed year: dividends always, earnings once it is likely reported"""
+    last_complete = now.year - 1
+    dividends_behind = manifest["DividendsThrough"] < last_complete
+    earnings_behind = ~(manifest["EarningsThrough"] >= last_complete)
+    recheck = manifest["FetchedAt"] < now - pd.Timedelta(days=EARNINGS_RECHECK_DAYS)
+    return set(manifest.index[dividends_behind | (earnings_behind & recheck)])
+
+def fetch_ticker_history(ticker):
+    """Annual EPS and dividend totals for one ticker as two long DataFrames"""
+    stock = yf.Ticker(ticker)
+
+    earnings = pd.DataFrame(columns=["Ticker", "Year", "EPS"])
+    income = stock.income_stmt
+    if income is not None and not income.empty:
+        row = next((r for r in _EPS_ROWS if r in income.index), None)
+        if row is not None:
+            eps = income.loc[row].dropna()
+            earnings = pd.DataFrame({
+                "Ticker": ticker,
+                "Year": pd.to_datetime(eps.index).year,
+                "EPS": eps.astype(float).values,
+            })
+
+    dividends = pd.DataFrame(columns=["Ticker", "Year", "Dividends"])
+    payouts = stock.dividends
+    if payouts is not None and not payouts.empty:
+        yearly = payouts.groupby(payouts.index.year).sum()
+        dividends = pd.DataFrame({
+            "Ticker": ticker,
+            "Year": yearly.index.astype(int),
+            "Dividends": yearly.astype(float).values,
+        })
+
+    return earnings, dividends
+
+def _newer(df, through):
+    return df if pd.isna(through) else df[df["Year"] > through]
+
+def ingest_history(tickers, log_callback=None, batch_size=100):
+    """Download history for tickers that are not cached or are missing a completed year. log_callback(ticker, current, total)
+
+    Cached years are never written again; only the years after a ticker's recorded coverage are appended.
+    """
+    now = pd.Timestamp.now()
+    last_complete = now.year - 1
+    manifest = _manifest()
+    # Entries written before coverage was recorded hold the earnings years already in the cache
+    cached_earnings = _read_parts(EARNINGS_DIR, ["Ticker", "Year", "EPS"]).groupby("Ticker")["Year"].max()
+    manifest["EarningsThrough"] = manifest["EarningsThrough"].fillna(cached_earnings)
+    tickers = list(dict.fromkeys(str(t) for t in tickers))
+    stale = _stale(manifest[manifest.index.isin(tickers)], now)
+    missing = [t for t in tickers if t not in manifest.index or t in stale]
+    if not missing:
+        return 0
+    print(f"[INFO] Fetching earnings and dividend history for {len(missing)} tickers "
+          f"({len(stale)} cached tickers missing a newer year, {len(manifest)} cached)")
+
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        earnings_parts, dividend_parts, entries = [], [], []
+        for index, ticker in enumerate(batch, start + 1):
+            if log_callback:
+                log_callback(ticker, index, len(missing))
+            try:
+                earnings, dividends = fetch_ticker_history(ticker)
+            except Exception as e:
+                # Left out of the manifest so the next run retries it
+                print(f"[ERROR] {ticker}: history unavailable - {type(e).__name__} - {e}")
+                continue
+
+            earnings_through = manifest["EarningsThrough"].get(ticker, float("nan"))
+            dividends_through = manifest["DividendsThrough"].get(ticker, float("nan"))
+            earnings = _newer(earnings, earnings_through)
+            # The current year's dividends are still incomplete, so they wait until the year is over
+            dividends = _newer(dividends, dividends_through)
+            dividends = dividends[dividends["Year"] <= last_complete]
+            earnings_parts.append(earnings)
+            dividend_parts.append(dividends)
+            entries.append({
+                "Ticker": ticker,
+                "FetchedAt": now,
+                "EarningsThrough": earnings["Year"].max() if not earnings.empty else earnings_through,
+                "DividendsThrough": last_complete,
+            })
+
+        name = f"part-{pd.Timestamp.now().strftime('%Y%m%d%H%M%S%f')}"
+        earnings_parts = [e for e in earnings_parts if not e.empty]
+        dividend_parts = [d for d in dividend_parts if not d.empty]
+        if earnings_parts:
+            _write_part(pd.concat(earnings_parts, ignore_index=True), EARNINGS_DIR, name)
+        if dividend_parts:
+            _write_part(pd.concat(dividend_parts, ignore_index=True), DIVIDENDS_DIR, name)
+        # The manifest is written last, so a crash mid-batch only causes a re-fetch, never a gap
+        if entries:
+            _write_part(pd.DataFrame(entries, columns=_MANIFEST_COLUMNS), MANIFEST_DIR, name)
+    return len(missing)
+
+def _consecutive_years(df, value_column, latest_year=None):
+    """Length of the unbroken run of years with a positive value, counted back from each ticker's latest year"""
+    df = df.dropna(subset=[value_column]).drop_duplicates(["Ticker", "Year"], keep="last")
+    if df.empty:
+        return pd.Series(dtype=float)
+    df = df.sort_values(["Ticker", "Year"], ascending=[True, False])
+    grouped = df.groupby("Ticker")
+
+    contiguous = grouped["Year"].diff().fillna(-1).eq(-1)
+    ok = (df[value_column] > 0) & contiguous
+    if latest_year is not None:
+        # The run has to reach (almost) the present, otherwise the record is already broken
+        ok &= grouped["Year"].transform("max") >= latest_year
+    return ok.astype(int).groupby(df["Ticker"]).cumprod().groupby(df["Ticker"]).sum()
+
+def _earnings_growth(earnings):
+    """Graham's growth test: average EPS of the last 3 years over the first 3 years of the window"""
+    df = earnings.dropna(subset=["EPS"]).drop_duplicates(["Ticker", "Year"], keep="last")
+    if df.empty:
+        return pd.Series(dtype=float)
+    df = df[df["Year"] > df.groupby("Ticker")["Year"].transform("max") - GROWTH_WINDOW_YEARS]
+    df = df.sort_values(["Ticker", "Year"])
+    grouped = df.groupby("Ticker")
+
+    # Short histories fall back to comparing single years so the averages never overlap
+    count = grouped["EPS"].transform("size")
+    span = (count // 2).clip(upper=3)
+    position = grouped.cumcount()
+    first = df["EPS"].where(position < span).groupby(df["Ticker"]).mean()
+    last = df["EPS"].where(position >= count - span).groupby(df["Ticker"]).mean()
+    growth = last / first - 1
+    return growth.where((first > 0) & (grouped.size() >= 2))
+
+def compute_history_metrics():
+    """Stability and growth columns for every cached ticker, indexed by Ticker"""
+    earnings = _read_parts(EARNINGS_DIR, ["Ticker", "Year", "EPS"])
+    dividends = _read_parts(DIVIDENDS_DIR, ["Ticker", "Year", "Dividends"])
+
+    metrics = pd.DataFrame(index=pd.Index(sorted(cached_tickers()), name="Ticker"))
+    metrics["YearsPositiveEarnings"] = _consecutive_years(earnings, "EPS")
+    metrics["YearsDividends"] = _consecutive_years(dividends, "Dividends", latest_year=pd.Timestamp.now().year - 1)
+    metrics["EarningsGrowth"] = _earnings_growth(earnings)
+    # Cached tickers with no record at all have zero years, not unknown years
+    metrics[["YearsPositiveEarnings", "YearsDividends"]] = metrics[["YearsPositiveEarnings", "YearsDividends"]].fillna(0)
+    return metrics
+
+def attach_history_metrics(df, ingest=False, log_callback=None):
+    """Add the history columns to a processed snapshot, keyed by the listing the data was fetched from"""
+    if df.empty:
+        return df
+    keys = df["SourceTicker"].fillna(df["Ticker"]) if "SourceTicker" in df.columns else df["Ticker"]
+    keys = keys.astype(str)
+    if ingest:
+        ingest_history(keys.unique(), log_callback)
+
+    metrics = compute_history_metrics()
+    df = df.drop(columns=[c for c in HISTORY_COLUMNS if c in df.columns])
+    return pd.concat([df, metrics.reindex(keys.values).set_axis(df.index)], axis=1)
@@ -1,7 +1,11 @@
+import os
 import pandas as pd
 import yfinance as yf
 import requests
 from requests.exceptions import HTTPError
+from data_processing.fx import normalize_currency
+from data_processing.history import attach_history_metrics
+from data_processing.universe import ensure_universe, get_market_listings, fetch_tickers
 
 def process_ticker(ticker, log_callback=None):
     try:
@@ -39,6 +43,9 @@ def process_ticker(ticker, log_callback=None):
             "DebtToEquity": info.get("debtToEquity"),
             "CurrentRatio": info.get("currentRatio"),
             "MarketCap": info.get("marketCap"),
+            "Sector": info.get("sector"),
+            "Currency": info.get("currency"),
+            "FinancialCurrency": info.get("financialCurrency"),
             "LastUpdated": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
@@ -52,25 +59,94 @@ def process_ticker(ticker, log_callback=None):
         print(f"[ERROR] {ticker}: {type(e).__name__} - {e}")
         return None
 
+def save_snapshot(df, market):
+    os.makedirs("data/processed", exist_ok=True)
+    out_path = f"data/processed/{market}_tickers.csv"
+    df.to_csv(out_path, index=False)
+    # Columnar copy for the SQL engine (core/query.py)
+    df.to_parquet(f"data/processed/{market}_tickers.parquet", index=False)
+    return out_path
+
+def build_snapshot(rows):
+    """Snapshot DataFrame from fetched rows, with monetary fields also converted to USD"""
+    return normalize_currency(pd.DataFrame(rows))
+
+def fetch_issuers(sources, log_callback=None):
+    """Fetch each source ticker once. log_callback(ticker, company_name, current, total)"""
+    sources = list(dict.fromkeys(sources))
+    total = len(sources)
+    fetched = {}
+
+    for index, ticker in enumerate(sources, 1):
+        result = process_ticker(ticker, log_callback=lambda t, cn=None: log_callback(t, cn, index, total) if log_callback else None)
+        if result:
+            fetched[ticker] = result
+    return fetched
+
+def fan_out(tickers, source_map, fetched):
+    """Copy each fetched row to the secondary lines fetched through it (see data_processing/universe.py)"""
+    results = []
+    for ticker in tickers:
+        source = source_map.get(ticker, ticker)
+        result = fetched.get(source)
+        if result:
+            row = dict(result)
+            row["Ticker"] = ticker
+            row["SourceTicker"] = source
+            results.append(row)
+    return results
+
 def process_data(file_path, market, log_callback=None):
-    df = pd.read_csv(file_path)
+    """Fetch the listings in file_path and build the market's snapshot
+
+    The snapshot is returned, not saved: the caller attaches history first and writes it once.
+    """
+    df = pd.read_csv(file_path, dtype={'Ticker': str})
 
     if 'Ticker' not in df.columns:
         raise ValueError("CSV must contain a 'Ticker' column.")
 
-    results = []
-    total_tickers = len(df)
-    processed_tickers = 0
+    tickers = df['Ticker'].dropna().tolist()
+    total_tickers = len(tickers)
+    source_map = fetch_tickers(tickers, market).to_dict()
+    issuers = list(dict.fromkeys(source_map[t] for t in tickers))
+    if len(issuers) < total_tickers:
+        print(f"[INFO] {total_tickers} listings in {market} map to {len(issuers)} issuers")
 
-    for index, ticker in enumerate(df['Ticker'], 1):
-        result = process_ticker(ticker, log_callback=lambda t, cn=None: log_callback(t, cn, index, total_tickers) if log_callback else None)
-        if result:
-            results.append(result)
-            if result['Price'] is not None:
-                processed_tickers += 1
+    fetched = fetch_issuers(issuers, log_callback)
+    results = fan_out(tickers, source_map, fetched)
+    processed_tickers = sum(1 for r in results if r['Price'] is not None)
 
-    result_df = pd.DataFrame(results)
-    result_df.to_csv(f'data/processed/{market}_tickers.csv', index=False)
-    success_rate = (processed_tickers / total_tickers) * 100
+    result_df = build_snapshot(results)
+    success_rate = (processed_tickers / total_tickers) * 100 if total_tickers else 0
     print(f"Successfully processed {processed_tickers}/{total_tickers} tickers ({success_rate:.2f}% for {market})")
-    return result_df 
\ No newline at end of file
+    return result_df
+
+def process_markets(markets, log_callback=None, on_snapshot=None):
+    """Process several markets, fetching each issuer once no matter how many of them list it
+
+    on_snapshot(market, df) is called after each snapshot is written, e.g. core.monitor.refresh_market.
+    """
+    universe = ensure_universe()
+    market_tickers = {}
+    source_map = {}
+    for market in markets:
+        listings = get_market_listings(market, universe)
+        market_tickers[market] = listings["Ticker"].tolist()
+        source_map[market] = dict(zip(listings["Ticker"], listings["FetchTicker"]))
+
+    issuers = [source_map[m][t] for m in markets for t in market_tickers[m]]
+    unique_issuers = list(dict.fromkeys(issuers))
+    print(f"[INFO] {len(issuers)} listings across {len(markets)} markets map to {len(unique_issuers)} issuers")
+    fetched = fetch_issuers(unique_issuers, log_callback)
+
+    snapshots = {}
+    for market in markets:
+        result_df = build_snapshot(fan_out(market_tickers[market], source_map[market], fetched))
+        result_df = attach_history_metrics(result_df)
+        save_snapshot(result_df, market)
+        if on_snapshot:
+            on_snapshot(market, result_df)
+        snapshots[market] = result_df
+        print(f"Saved {len(result_df)} rows for {market}")
+    return snapshots
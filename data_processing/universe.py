@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import glob
+import unicodedata
+import pandas as pd
+import pyarrow as pa
+from typing import Dict, List, Optional
+
+# The universe index is one uncompressed Arrow IPC file so it can be memory-mapped
+# instead of parsing every CSV in data/raw on each run.
+RAW_DIR = "data/raw"
+UNIVERSE_PATH = "data/processed/universe.arrow"
+
+HOME_EXCHANGES_PATH = "data/configs/home_exchanges.json"
+
+# Venues that mostly carry secondary lines of ordinary shares whose home market is elsewhere.
+# Such a line reuses the data of its issuer's home listing when that listing is known.
+SECONDARY_MARKETS = {"US_OTC", "FRA", "MUN", "DUSE", "HAM"}
+
+# Foreign lines on otherwise primary venues (LSE international order book, Borsa Italiana global market)
+SECONDARY_TICKER_PATTERNS = {
+    "LON": re.compile(r"^0[A-Z0-9]{3}\.L$"),
+    "BIT": re.compile(r"^1.+\.MI$"),
+}
+
+# Depositary receipts (CDRs, CEDEARs, BDRs, OTC ADRs) represent a different number of shares
+# than the underlying, so they are always fetched on their own and never share per-share data
+DEPOSITARY_MARKETS = {"NEO", "BCBA"}
+DEPOSITARY_TICKER_PATTERNS = {
+    "US_OTC": re.compile(r"^[A-Z]{4}Y$"),
+    "BVMF": re.compile(r"^[A-Z0-9]{4}3[2-9]\.SA$"),
+}
+
+# German regional exchanges often trade ADRs or GDRs of issuers from outside Europe and the US,
+# so their lines only reuse the home listing's data for issuers based in these markets
+GERMAN_REGIONAL_MARKETS = {"FRA", "MUN", "DUSE", "HAM"}
+ORDINARY_LINE_HOME_MARKETS = {
+    "NYSE", "NASDAQ", "LON", "ETR", "EPA", "AMS", "EBR", "LUX", "BIT", "BME", "ELI", "STO", "CPH",
+    "HEL", "OSL", "ICE", "SWX", "VIE", "WSE", "PRA", "BUD", "ATH", "ISE",
+}
+
+_LEGAL_FORMS = [
+    (r"\baktiengesellschaft\b", "ag"),
+    (r"\baktien gesellschaft\b", "ag"),
+    (r"\bcorporation\b", "corp"),
+    (r"\bincorporated\b", "inc"),
+    (r"\bcompany\b", "co"),
+    (r"\blimited\b", "ltd"),
+    (r"\bpublic limited co\b", "plc"),
+    (r"\bpubl\b", ""),
+]
+
+def normalize_company_name(name: str) -> str:
+    """Reduce a company name to a key that is equal across its listings"""
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii").lower()
+    name = name.replace("&", " and ")
+    name = re.sub(r"[^a-z0-9]+", " ", name)
+    name = re.sub(r"^the ", "", name.strip())
+    for pattern, replacement in _LEGAL_FORMS:
+        name = re.sub(pattern, replacement, name)
+    return " ".join(name.split())
+
+_SHARE_CLASS = re.compile(r"^.+?[.\-]([A-Z])$")
+_NAME_SHARE_CLASS = r"\b(?:class|series|ser) [a-z]\b"
+
+def load_home_exchanges(path: str = HOME_EXCHANGES_PATH) -> Dict[str, str]:
+    """Home listing (ticker -> market) of issuers that are listed on several primary venues"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["issuers"]
+    except FileNotFoundError:
+        return {}
+
+def share_class(ticker: str, market_suffix: str) -> str:
+    """Share class letter of a listing (VOLV.B.ST, MAERSK-A.CO, BRK-B), or "" when it has none"""
+    root = ticker[:-len(market_suffix)] if market_suffix and ticker.endswith(market_suffix) else ticker
+    match = _SHARE_CLASS.match(root)
+    return match.group(1) if match else ""
+
+def _market_suffixes(listings: pd.DataFrame) -> pd.Series:
+    """The Yahoo suffix most tickers of each market end with (".ST", ".CO"); "" for US markets"""
+    suffix = listings["Ticker"].str.extract(r"(\.[A-Z0-9]+)$", expand=False).fillna("")
+    common = suffix.groupby(listings["Market"]).agg(lambda s: s.mode().iloc[0] if not s.mode().empty else "")
+    return listings["Market"].map(common)
+
+def _read_raw_listings(raw_dir: str) -> pd.DataFrame:
+    frames = []
+    for path in sorted(glob.glob(os.path.join(raw_dir, "*.csv"))):
+        market = os.path.splitext(os.path.basename(path))[0]
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        if 'Ticker' not in df.columns:
+            print(f"[ERROR] {path}: CSV must contain a 'Ticker' column. Skipping.")
+            continue
+        df = df[df['Ticker'].str.strip() != ""]
+        frames.append(pd.DataFrame({
+            "Ticker": df['Ticker'].str.strip(),
+            "Company": df['Company'].str.strip() if 'Company' in df.columns else "",
+            "Market": market,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["Ticker", "Company", "Market"])
+    return pd.concat(frames, ignore_index=True).drop_duplicates(["Market", "Ticker"])
+
+def _listing_roles(listings: pd.DataFrame) -> pd.Series:
+    role = pd.Series("primary", index=listings.index, dtype=object)
+    secondary = listings["Market"].isin(SECONDARY_MARKETS)
+    for market, pattern in SECONDARY_TICKER_PATTERNS.items():
+        secondary |= (listings["Market"] == market) & listings["Ticker"].str.match(pattern)
+    depositary = listings["Market"].isin(DEPOSITARY_MARKETS)
+    for market, pattern in DEPOSITARY_TICKER_PATTERNS.items():
+        depositary |= (listings["Market"] == market) & listings["Ticker"].str.match(pattern)
+    role[secondary] = "secondary"
+    role[depositary] = "depositary"
+    return role
+
+def build_universe(raw_dir: str = RAW_DIR, out_path: str = UNIVERSE_PATH) -> pd.DataFrame:
+    """Map every listing in raw_dir to its issuer and the listing it is fetched through, and write the index to out_path
+
+    Issuers are keyed on company name plus share class. The home listing comes from the explicit
+    map in data/configs/home_exchanges.json, or is the issuer's only primary listing. Secondary lines
+    are fetched through the home listing; primary listings and depositary receipts are always fetched
+    on their own, so per-share fields are never copied across ADRs, DRs or share classes.
+    """
+    listings = _read_raw_listings(raw_dir)
+
+    listings["ShareClass"] = [share_class(t, s) for t, s in zip(listings["Ticker"], _market_suffixes(listings))]
+    name_key = listings["Company"].map(normalize_company_name)
+    name_key = name_key.str.replace(_NAME_SHARE_CLASS, "", regex=True).str.strip()
+    # A line without a class letter can't be matched to one class of a multi-class issuer
+    classes_per_name = listings.loc[listings["ShareClass"] != ""].groupby(name_key)["ShareClass"].nunique()
+    ambiguous = (listings["ShareClass"] == "") & name_key.map(classes_per_name).fillna(0).gt(0)
+    listings["IssuerKey"] = name_key + "|" + listings["ShareClass"]
+    # Listings without a usable name, or of an unknown class, are their own issuer
+    own = (name_key == "") | ambiguous
+    listings.loc[own, "IssuerKey"] = "ticker:" + listings.loc[own, "Market"] + ":" + listings.loc[own, "Ticker"]
+    listings["Role"] = _listing_roles(listings)
+
+    home_exchanges = load_home_exchanges()
+    mapped = pd.Series([home_exchanges.get(t) == m for t, m in zip(listings["Ticker"], listings["Market"])],
+                       index=listings.index)
+    primary = listings[listings["Role"] == "primary"]
+    only_primary = primary.groupby("IssuerKey").filter(lambda g: len(g) == 1)
+    home = pd.concat([
+        listings[mapped],
+        only_primary[~only_primary["IssuerKey"].isin(listings.loc[mapped, "IssuerKey"])],
+    ]).drop_duplicates("IssuerKey").set_index("IssuerKey")
+
+    listings["IssuerId"] = listings["IssuerKey"].astype("category").cat.codes.astype("int32")
+    listings["CanonicalTicker"] = listings["IssuerKey"].map(home["Ticker"])
+    listings["CanonicalMarket"] = listings["IssuerKey"].map(home["Market"])
+    listings["IsCanonical"] = (listings["Ticker"] == listings["CanonicalTicker"]) & (listings["Market"] == listings["CanonicalMarket"])
+
+    shares_home_data = (
+        (listings["Role"] == "secondary")
+        & listings["CanonicalTicker"].notna()
+        & (~listings["Market"].isin(GERMAN_REGIONAL_MARKETS) | listings["CanonicalMarket"].isin(ORDINARY_LINE_HOME_MARKETS))
+    )
+    listings["FetchTicker"] = listings["CanonicalTicker"].where(shares_home_data, listings["Ticker"])
+
+    universe = listings[["Ticker", "Company", "Market", "ShareClass", "Role", "IssuerId",
+                         "CanonicalTicker", "CanonicalMarket", "IsCanonical", "FetchTicker"]]
+    universe = universe.sort_values(["Market", "Ticker"], ignore_index=True)
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    table = pa.Table.from_pandas(universe, preserve_index=False)
+    tmp_path = f"{out_path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, out_path)
+
+    issuer_count = universe["IssuerId"].nunique()
+    fetch_count = universe["FetchTicker"].nunique()
+    print(f"[INFO] Universe index: {len(universe)} listings -> {issuer_count} issuers, {fetch_count} fetches ({out_path})")
+    return universe
+
+def load_universe(path: str = UNIVERSE_PATH) -> pd.DataFrame:
+    """Load the universe index through a memory map"""
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+def is_universe_stale(raw_dir: str = RAW_DIR, path: str = UNIVERSE_PATH) -> bool:
+    if not os.path.exists(path):
+        return True
+    built_at = os.path.getmtime(path)
+    sources = glob.glob(os.path.join(raw_dir, "*.csv")) + glob.glob(HOME_EXCHANGES_PATH)
+    if any(os.path.getmtime(p) > built_at for p in sources):
+        return True
+    # Indexes written before listing roles existed have no FetchTicker column
+    return "FetchTicker" not in pa.ipc.open_file(pa.memory_map(path, "r")).schema.names
+
+def ensure_universe(raw_dir: str = RAW_DIR, path: str = UNIVERSE_PATH) -> pd.DataFrame:
+    """Load the universe index, rebuilding it first if any raw ticker file changed"""
+    if is_universe_stale(raw_dir, path):
+        return build_universe(raw_dir, path)
+    return load_universe(path)
+
+def get_market_listings(market: str, universe: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Listings of one market with the ticker each one is fetched through"""
+    if universe is None:
+        universe = ensure_universe()
+    return universe[universe["Market"] == market]
+
+def fetch_tickers(tickers: List[str], market: str, universe: Optional[pd.DataFrame] = None) -> pd.Series:
+    """Map the given listings of market to the tickers they are fetched through; unknown listings map to themselves"""
+    listings = get_market_listings(market, universe).set_index("Ticker")["FetchTicker"]
+    tickers = pd.Series([str(t) for t in tickers], dtype=object)
+    return tickers.map(listings).fillna(tickers).set_axis(tickers.values)
+
+def main():
+    build_universe()
+
+if __name__ == "__main__":
+    main()
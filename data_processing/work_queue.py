@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import argparse
+import threading
+import pandas as pd
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable
+from data_processing.processer import process_ticker, fan_out, build_snapshot, save_snapshot
+from data_processing.universe import ensure_universe, get_market_listings
+from data_processing.history import attach_history_metrics
+
+# Local stand-in broker: one SQLite file. Put it on a shared filesystem to run workers on several nodes.
+QUEUE_PATH = "data/queue/work_queue.sqlite"
+DEFAULT_SHARD_SIZE = 50
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    markets TEXT NOT NULL,
+    created REAL NOT NULL,
+    finalized REAL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    shard_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    tickers TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS shards_claim ON shards (status, lease_expires);
+CREATE TABLE IF NOT EXISTS results (
+    job_id TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    row TEXT NOT NULL,
+    shard_id TEXT NOT NULL,
+    PRIMARY KEY (job_id, ticker)
+);
+"""
+
+@dataclass
+class Lease:
+    shard_id: str
+    job_id: str
+    tickers: List[str]
+    token: str
+    expires: float
+
+class SQLiteBroker:
+    """Shard queue with lease/heartbeat semantics backed by a single SQLite file"""
+
+    def __init__(self, path: str = QUEUE_PATH, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        # One short-lived connection per operation so heartbeat threads never share a handle
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def submit_job(self, issuers: List[str], markets: List[str], shard_size: int = DEFAULT_SHARD_SIZE) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        issuers = list(dict.fromkeys(issuers))
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO jobs (job_id, markets, created) VALUES (?, ?, ?)",
+                         (job_id, json.dumps(markets), time.time()))
+            conn.executemany(
+                "INSERT INTO shards (shard_id, job_id, tickers) VALUES (?, ?, ?)",
+                [(f"{job_id}-{i // shard_size:05d}", job_id, json.dumps(issuers[i:i + shard_size]))
+                 for i in range(0, len(issuers), shard_size)]
+            )
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Lease]:
+        """Lease one pending shard, or a shard whose previous lease has expired"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT shard_id, job_id, tickers FROM shards "
+                "WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) AND attempts < ? "
+                "ORDER BY job_id, shard_id LIMIT 1",
+                (now, self.max_attempts)
+            ).fetchone()
+            if row is None:
+                return None
+            token = uuid.uuid4().hex
+            expires = now + self.lease_seconds
+            conn.execute(
+                "UPDATE shards SET status = 'leased', owner = ?, lease_token = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE shard_id = ?",
+                (worker_id, token, expires, row[0])
+            )
+        return Lease(row[0], row[1], json.loads(row[2]), token, expires)
+
+    def heartbeat(self, lease: Lease) -> bool:
+        """Extend a lease. Returns False if the lease was lost to another worker"""
+        expires = time.time() + self.lease_seconds
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE shards SET lease_expires = ? WHERE shard_id = ? AND lease_token = ? AND status = 'leased'",
+                (expires, lease.shard_id, lease.token)
+            ).rowcount
+        if updated:
+            lease.expires = expires
+        return bool(updated)
+
+    def commit(self, lease: Lease, rows: Dict[str, Dict[str, Any]]) -> bool:
+        """Store a shard's results if the lease is still held. Returns False for a stale lease.
+
+        Results are keyed by (job, ticker), so a shard that is fetched twice after a reassignment
+        still produces a single row per ticker.
+        """
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE shards SET status = 'done', lease_token = NULL, lease_expires = NULL "
+                "WHERE shard_id = ? AND lease_token = ?",
+                (lease.shard_id, lease.token)
+            ).rowcount
+            if not updated:
+                return False
+            conn.executemany(
+                "INSERT OR REPLACE INTO results (job_id, ticker, row, shard_id) VALUES (?, ?, ?, ?)",
+                [(lease.job_id, ticker, json.dumps(row), lease.shard_id) for ticker, row in rows.items()]
+            )
+        return True
+
+    def reap_expired(self) -> int:
+        """Return expired leases to the queue. Shards out of attempts are marked failed"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE shards SET status = 'failed', owner = NULL, lease_token = NULL "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, self.max_attempts)
+            )
+            return conn.execute(
+                "UPDATE shards SET status = 'pending', owner = NULL, lease_token = NULL, lease_expires = NULL "
+                "WHERE status = 'leased' AND lease_expires < ?",
+                (now,)
+            ).rowcount
+
+    def job_status(self, job_id: str) -> Dict[str, int]:
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM shards WHERE job_id = ? GROUP BY status", (job_id,)).fetchall()
+        return {status: count for status, count in rows}
+
+    def has_open_shards(self) -> bool:
+        """True while any shard is still pending or leased, including leases that have not been reaped yet"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "SELECT 1 FROM shards WHERE status IN ('pending', 'leased') LIMIT 1"
+            ).fetchone() is not None
+
+    def open_jobs(self) -> List[str]:
+        with self._transaction() as conn:
+            return [r[0] for r in conn.execute("SELECT job_id FROM jobs WHERE finalized IS NULL ORDER BY created")]
+
+    def job_markets(self, job_id: str) -> List[str]:
+        with self._transaction() as conn:
+            return json.loads(conn.execute("SELECT markets FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0])
+
+    def job_results(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT ticker, row FROM results WHERE job_id = ?", (job_id,)).fetchall()
+        return {ticker: json.loads(row) for ticker, row in rows}
+
+    def mark_finalized(self, job_id: str):
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET finalized = ? WHERE job_id = ?", (time.time(), job_id))
+
+def submit_markets(broker: SQLiteBroker, markets: List[str], shard_size: int = DEFAULT_SHARD_SIZE) -> str:
+    """Split the issuers behind the given markets into shards and queue them"""
+    universe = ensure_universe()
+    issuers = []
+    for market in markets:
+        issuers.extend(get_market_listings(market, universe)["FetchTicker"].tolist())
+    job_id = broker.submit_job(issuers, markets, shard_size)
+    print(f"[INFO] Submitted job {job_id}: {len(set(issuers))} issuers for {', '.join(markets)}")
+    return job_id
+
+def _heartbeat_loop(broker: SQLiteBroker, lease: Lease, stop: threading.Event, lost: threading.Event):
+    while not stop.wait(broker.lease_seconds / 3):
+        if not broker.heartbeat(lease):
+            lost.set()
+            return
+
+def run_worker(broker: SQLiteBroker, worker_id: Optional[str] = None, idle_exit: bool = True, poll_seconds: float = 5.0):
+    """Claim shards, fetch them and commit the results until the queue is empty
+
+    With idle_exit the worker only stops once no shard is pending or leased anywhere; while other
+    workers still hold leases it keeps polling, so a shard whose lease expires is picked up again.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    while True:
+        lease = broker.claim(worker_id)
+        if lease is None:
+            # Shards leased by other workers may still expire and come back to the queue
+            if idle_exit and not broker.has_open_shards():
+                print(f"[INFO] Worker {worker_id}: no shards left")
+                return
+            time.sleep(poll_seconds)
+            continue
+
+        print(f"[INFO] Worker {worker_id}: claimed {lease.shard_id} ({len(lease.tickers)} tickers)")
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat_loop, args=(broker, lease, stop, lost), daemon=True)
+        heartbeat.start()
+        rows = {}
+        try:
+            for ticker in lease.tickers:
+                if lost.is_set():
+                    break
+                result = process_ticker(ticker)
+                if result:
+                    rows[ticker] = result
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if lost.is_set():
+            print(f"[WARNING] Worker {worker_id}: lease on {lease.shard_id} expired, dropping partial results")
+            continue
+        if broker.commit(lease, rows):
+            print(f"[INFO] Worker {worker_id}: committed {lease.shard_id} ({len(rows)}/{len(lease.tickers)} fetched)")
+        else:
+            print(f"[WARNING] Worker {worker_id}: lease on {lease.shard_id} was reassigned, results discarded")
+
+def _merge_previous(result_df: pd.DataFrame, market: str) -> pd.DataFrame:
+    """Committed rows over the market's existing snapshot, keeping previous rows for listings this job did not fetch"""
+    path = f"data/processed/{market}_tickers.csv"
+    if not os.path.exists(path):
+        return result_df
+    previous = pd.read_csv(path, dtype={'Ticker': str})
+    if result_df.empty:
+        return previous
+    kept = previous[~previous["Ticker"].astype(str).isin(result_df["Ticker"].astype(str))]
+    return pd.concat([result_df, kept], ignore_index=True)
+
+def finalize_job(broker: SQLiteBroker, job_id: str,
+                 on_snapshot: Optional[Callable[[str, pd.DataFrame], Any]] = None) -> bool:
+    """Write the processed snapshots of a job once every shard is done. Safe to call repeatedly
+
+    If any shard failed, the committed rows are merged into the existing snapshot instead of
+    replacing it, so a partial job never drops listings it could not fetch. on_snapshot(market, df)
+    is called after each snapshot is written.
+    """
+    status = broker.job_status(job_id)
+    if any(s in status for s in ("pending", "leased")):
+        return False
+
+    fetched = broker.job_results(job_id)
+    failed = status.get("failed", 0)
+    if failed:
+        print(f"[WARNING] Job {job_id}: {failed} shards failed after {broker.max_attempts} attempts; "
+              "merging committed rows into the existing snapshots")
+    universe = ensure_universe()
+    for market in broker.job_markets(job_id):
+        listings = get_market_listings(market, universe)
+        source_map = dict(zip(listings["Ticker"], listings["FetchTicker"]))
+        result_df = build_snapshot(fan_out(listings["Ticker"].tolist(), source_map, fetched))
+        if failed:
+            result_df = _merge_previous(result_df, market)
+        if not fetched or result_df.empty:
+            print(f"[WARNING] Job {job_id}: no rows fetched for {market}, snapshot left unchanged")
+            continue
+        # Cached history only; the coordinator never downloads it
+        result_df = attach_history_metrics(result_df)
+        save_snapshot(result_df, market)
+        if on_snapshot:
+            on_snapshot(market, result_df)
+        print(f"[INFO] Job {job_id}: saved {len(result_df)} rows for {market}")
+    broker.mark_finalized(job_id)
+    return True
+
+def run_coordinator(broker: SQLiteBroker, poll_seconds: float = 10.0, exit_when_idle: bool = True,
+                    on_snapshot: Optional[Callable[[str, pd.DataFrame], Any]] = None):
+    """Reassign expired leases and finalize finished jobs"""
+    while True:
+        reassigned = broker.reap_expired()
+        if reassigned:
+            print(f"[INFO] Coordinator: returned {reassigned} expired shards to the queue")
+        open_jobs = broker.open_jobs()
+        for job_id in open_jobs:
+            finalize_job(broker, job_id, on_snapshot)
+        if exit_when_idle and not broker.open_jobs():
+            return
+        time.sleep(poll_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed fetch work queue")
+    parser.add_argument("--broker", default=QUEUE_PATH, help="Path to the SQLite broker file")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit = subparsers.add_parser("submit", help="Queue the tickers of one or more markets")
+    submit.add_argument("markets", nargs="+")
+    submit.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+
+    worker = subparsers.add_parser("worker", help="Claim and fetch shards")
+    worker.add_argument("--id", default=None)
+    worker.add_argument("--wait", action="store_true", help="Keep polling when the queue is empty")
+
+    coordinator = subparsers.add_parser("coordinator", help="Reassign expired leases and write snapshots")
+    coordinator.add_argument("--poll-seconds", type=float, default=10.0)
+
+    args = parser.parse_args()
+    broker = SQLiteBroker(args.broker, lease_seconds=args.lease_seconds)
+
+    if args.command == "submit":
+        submit_markets(broker, args.markets, args.shard_size)
+    elif args.command == "worker":
+        run_worker(broker, args.id, idle_exit=not args.wait)
+    elif args.command == "coordinator":
+        # Only the coordinator writes snapshots, so only it needs the screen monitor (and duckdb)
+        from core.monitor import refresh_market
+        run_coordinator(broker, args.poll_seconds, on_snapshot=refresh_market)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import pandas as pd
+import pytest
+import data_processing.fx as fx
+from core.screen import filter as graham_filter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(autouse=True)
+def repo_rates(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    monkeypatch.setattr(fx, "_warned", set())
+    return fx.load_fx_rates()
+
+def test_each_column_is_converted_from_its_own_unit(repo_rates):
+    # SHEL.L: price in pence, market cap in pounds, EPS reported in dollars
+    shel = pd.DataFrame({"Ticker": ["SHEL.L"], "Price": [2500.0], "MarketCap": [150e9], "EPS": [3.0],
+                         "Currency": ["GBp"], "FinancialCurrency": ["USD"]})
+
+    df = fx.normalize_currency(shel)
+
+    gbp = repo_rates["GBP"]
+    assert df["PriceUSD"].iloc[0] == pytest.approx(25.0 * gbp)
+    assert df["MarketCapUSD"].iloc[0] == pytest.approx(150e9 * gbp)
+    assert df["EPSUSD"].iloc[0] == pytest.approx(3.0)
+    assert fx.usd_column(df, "MarketCap").iloc[0] == pytest.approx(150e9 * gbp)
+
+def test_snapshot_without_currency_column_is_used_unconverted(capsys):
+    legacy = pd.DataFrame({"Ticker": ["AAA", "BBB"], "MarketCap": [1e9, 2e9]})
+
+    assert fx.usd_column(legacy, "MarketCap").tolist() == [1e9, 2e9]
+    assert fx.usd_column(legacy, "MarketCap").tolist() == [1e9, 2e9]
+    # One warning telling the user to refresh, not one per call
+    assert capsys.readouterr().out.count("no recorded currency") == 1
+
+def test_only_known_currencies_without_a_rate_are_left_empty():
+    # Rows of a legacy market concatenated with a refreshed one have no currency
+    df = pd.DataFrame({"Ticker": ["AAA", "BBB", "CCC"], "MarketCap": [1e9, 2e9, 3e9],
+                       "Currency": ["USD", "XXX", None], "Market": ["NYSE", "NYSE", "OLD"]})
+
+    usd = fx.usd_column(df, "MarketCap")
+
+    assert usd.iloc[0] == pytest.approx(1e9)
+    assert pd.isna(usd.iloc[1])
+    assert usd.iloc[2] == pytest.approx(3e9)
+
+def test_graham_filter_keeps_legacy_rows():
+    legacy = pd.DataFrame({"Ticker": ["AAA"], "PE": [10.0], "PB": [1.0], "DebtToEquity": [0.2], "CurrentRatio": [2.0],
+                           "DividendYield": [0.03], "EPS": [2.0], "MarketCap": [1e9]})
+
+    assert graham_filter(legacy)["Ticker"].tolist() == ["AAA"]
@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+import core.monitor as monitor
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    def no_fingerprints(market, snapshot):
+        raise AssertionError("fingerprinted a market with no screens to check")
+    monkeypatch.setattr(monitor, "_update_fingerprints", no_fingerprints)
+    return pd.DataFrame({"Ticker": ["AAA"], "Price": [1.0]})
+
+def test_refresh_without_screens_does_no_work(snapshot):
+    assert monitor.refresh_market("TEST", snapshot) == []
+
+def test_refresh_skips_markets_without_screens(snapshot):
+    monitor._write_json(monitor.SCREENS_PATH, {"other": {"market": "OTHER", "filters": {}}})
+
+    assert monitor.refresh_market("TEST", snapshot) == []
@@ -0,0 +1,21 @@
+import os
+import shutil
+import pandas as pd
+import data_processing.processer as processer
+
+REPO_CONFIGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "configs")
+
+def test_process_data_builds_the_snapshot_without_writing_it(tmp_path, monkeypatch):
+    shutil.copytree(REPO_CONFIGS, tmp_path / "data" / "configs")
+    (tmp_path / "data" / "raw").mkdir()
+    pd.DataFrame({"Ticker": ["AAA", "BBB"]}).to_csv(tmp_path / "data" / "raw" / "TEST.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(processer, "process_ticker", lambda ticker, log_callback=None: {
+        "Ticker": ticker, "Price": 1.0, "MarketCap": 1e9, "Currency": "USD"})
+
+    df = processer.process_data("data/raw/TEST.csv", "TEST")
+
+    assert df["Ticker"].tolist() == ["AAA", "BBB"]
+    assert df["PriceUSD"].tolist() == [1.0, 1.0]
+    # The caller attaches history and saves, so each run writes the snapshot once
+    assert not os.path.exists("data/processed/TEST_tickers.csv")
@@ -0,0 +1,48 @@
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pytest
+from core.query import run_query, run_query_arrow
+
+@pytest.fixture
+def processed_dir(tmp_path):
+    directory = tmp_path / "processed"
+    directory.mkdir()
+    pd.DataFrame({"Ticker": ["AAA", "BBB"], "PE": [10.0, 20.0]}).to_parquet(directory / "NYSE_tickers.parquet")
+    pd.DataFrame({"Ticker": ["CCC"], "PE": [5.0]}).to_parquet(directory / "LON_tickers.parquet")
+    return str(directory)
+
+def test_query_returns_arrow_table_over_all_snapshots(processed_dir):
+    table = run_query_arrow("SELECT Market, COUNT(*) AS n FROM stocks GROUP BY Market ORDER BY Market", processed_dir)
+
+    assert isinstance(table, pa.Table)
+    assert table.to_pylist() == [{"Market": "LON", "n": 1}, {"Market": "NYSE", "n": 2}]
+    assert run_query("SELECT Ticker FROM stocks WHERE PE > 15", processed_dir)["Ticker"].tolist() == ["BBB"]
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 1; DROP VIEW stocks",
+    "SELECT 1; COPY (SELECT 1) TO 'out.csv'",
+    "DROP VIEW stocks",
+    "CREATE TABLE t AS SELECT 1",
+    "ATTACH 'other.db'",
+    "SET lock_configuration = false",
+])
+def test_only_a_single_select_is_accepted(processed_dir, sql):
+    with pytest.raises(ValueError):
+        run_query_arrow(sql, processed_dir)
+    # The view is rebuilt per query, so nothing above can break the next one
+    assert run_query_arrow("SELECT COUNT(*) AS n FROM stocks", processed_dir).to_pylist() == [{"n": 3}]
+
+@pytest.mark.parametrize("sql", [
+    "SELECT content FROM read_text('{outside}')",
+    "SELECT * FROM read_csv('{outside}')",
+    "SELECT * FROM glob('{parent}/*')",
+    "SELECT * FROM read_parquet('{processed}/../*.parquet')",
+])
+def test_files_outside_the_snapshot_directory_cannot_be_read(processed_dir, tmp_path, sql):
+    outside = tmp_path / "secret.csv"
+    outside.write_text("a,b\n1,2\n")
+    sql = sql.format(outside=outside, parent=tmp_path, processed=processed_dir)
+
+    with pytest.raises(duckdb.PermissionException):
+        run_query_arrow(sql, processed_dir)
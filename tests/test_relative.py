@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+from core.relative import RELATIVE_METRICS, _group_pass, compute_relative_metrics, relative_columns
+
+def _snapshot(sector):
+    return pd.DataFrame({
+        "Market": ["NYSE", "NYSE", "NYSE"],
+        "Ticker": ["AAA", "BBB", "CCC"],
+        "Sector": sector,
+        "PE": [10.0, 20.0, 30.0],
+        "PB": [1.0, 2.0, 3.0],
+        "EPS": [1.0, 2.0, 3.0],
+        "DividendYield": [0.01, 0.02, 0.03],
+        "DebtToEquity": [0.1, 0.2, 0.3],
+        "CurrentRatio": [1.0, 2.0, 3.0],
+        "MarketCap": [1e9, 2e9, 3e9],
+    })
+
+def test_group_pass_without_any_key_returns_nan_columns():
+    df = _snapshot([None, None, None])
+    result = _group_pass(df, "Sector", "Sector")
+
+    expected = [f"{m}_SectorPct" for m in RELATIVE_METRICS] + [f"{m}_SectorZ" for m in RELATIVE_METRICS]
+    assert list(result.columns) == expected
+    assert result.index.equals(df.index)
+    assert result.isna().all().all()
+
+def test_compute_relative_metrics_without_sectors_still_ranks_by_market():
+    result = compute_relative_metrics(_snapshot([np.nan, np.nan, np.nan]))
+
+    assert list(result.columns) == relative_columns()
+    assert result["PE_SectorPct"].isna().all()
+    assert result["PE_MarketPct"].tolist() == [1 / 3, 2 / 3, 1.0]
+
+def test_group_pass_ranks_within_each_sector():
+    result = _group_pass(_snapshot(["Tech", "Tech", "Energy"]), "Sector", "Sector")
+
+    assert result["PE_SectorPct"].tolist() == [0.5, 1.0, 1.0]
+    assert np.isnan(result["PE_SectorZ"].iloc[2])
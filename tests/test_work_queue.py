@@ -0,0 +1,88 @@
+import os
+import sys
+import shutil
+import subprocess
+import threading
+import time
+import pandas as pd
+import pytest
+import data_processing.work_queue as wq
+from data_processing.history import HISTORY_COLUMNS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_CONFIGS = os.path.join(REPO_ROOT, "data", "configs")
+TICKERS = ["AAA", "BBB", "CCC", "DDD"]
+
+def fake_ticker(price):
+    def process_ticker(ticker, log_callback=None):
+        return {"Ticker": ticker, "Name": ticker, "Price": price, "PE": 10.0, "MarketCap": 1e9,
+                "Currency": "USD", "FinancialCurrency": "USD"}
+    return process_ticker
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """A throwaway data/ tree with one market, so snapshots and the universe stay out of the repo"""
+    shutil.copytree(REPO_CONFIGS, tmp_path / "data" / "configs")
+    (tmp_path / "data" / "raw").mkdir()
+    pd.DataFrame({"Ticker": TICKERS, "Company": TICKERS}).to_csv(tmp_path / "data" / "raw" / "TEST.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(wq, "process_ticker", fake_ticker(1.0))
+    return tmp_path
+
+def snapshot():
+    return pd.read_csv("data/processed/TEST_tickers.csv").set_index("Ticker")
+
+def test_abandoned_lease_is_reaped_and_the_job_finishes(workspace):
+    broker = wq.SQLiteBroker(str(workspace / "queue.sqlite"), lease_seconds=0.5)
+    job_id = wq.submit_markets(broker, ["TEST"], shard_size=2)
+    # A worker that claims a shard and dies without committing or heartbeating
+    abandoned = broker.claim("crashed")
+
+    worker = threading.Thread(target=wq.run_worker, args=(broker, "w1"), kwargs={"poll_seconds": 0.05}, daemon=True)
+    coordinator = threading.Thread(target=wq.run_coordinator, args=(broker,), kwargs={"poll_seconds": 0.05}, daemon=True)
+    worker.start()
+    coordinator.start()
+    worker.join(timeout=20)
+    coordinator.join(timeout=20)
+
+    assert not worker.is_alive() and not coordinator.is_alive()
+    assert broker.job_status(job_id) == {"done": 2}
+    assert broker.open_jobs() == []
+    assert set(broker.job_results(job_id)) == set(TICKERS)
+    assert sorted(snapshot().index) == TICKERS
+    # Snapshots are written once, already carrying the cached history columns
+    assert set(HISTORY_COLUMNS) <= set(snapshot().columns)
+    assert not broker.commit(abandoned, {"AAA": {"Ticker": "AAA"}})
+
+def test_commit_with_a_stale_token_is_rejected(workspace):
+    broker = wq.SQLiteBroker(str(workspace / "queue.sqlite"), lease_seconds=0.1)
+    job_id = broker.submit_job(["AAA"], ["TEST"])
+    stale = broker.claim("slow")
+    time.sleep(0.2)
+    current = broker.claim("fast")
+
+    assert current.shard_id == stale.shard_id and current.token != stale.token
+    assert not broker.heartbeat(stale)
+    assert not broker.commit(stale, {"AAA": {"Ticker": "AAA", "Price": 1.0}})
+    assert broker.commit(current, {"AAA": {"Ticker": "AAA", "Price": 2.0}})
+    assert broker.job_results(job_id) == {"AAA": {"Ticker": "AAA", "Price": 2.0}}
+
+def test_failed_shards_are_merged_into_the_existing_snapshot(workspace):
+    wq.save_snapshot(pd.DataFrame({"Ticker": TICKERS, "Price": [5.0] * len(TICKERS)}), "TEST")
+    broker = wq.SQLiteBroker(str(workspace / "queue.sqlite"), lease_seconds=0.1, max_attempts=1)
+    job_id = wq.submit_markets(broker, ["TEST"], shard_size=2)
+
+    broker.commit(broker.claim("w1"), {t: wq.process_ticker(t) for t in ["AAA", "BBB"]})
+    broker.claim("w2")
+    time.sleep(0.2)
+    broker.reap_expired()
+
+    assert broker.job_status(job_id) == {"done": 1, "failed": 1}
+    assert wq.finalize_job(broker, job_id)
+    prices = snapshot()["Price"]
+    assert prices.to_dict() == {"AAA": 1.0, "BBB": 1.0, "CCC": 5.0, "DDD": 5.0}
+
+def test_workers_do_not_import_the_screen_monitor():
+    code = "import sys, data_processing.work_queue; print(any(m.startswith(('duckdb', 'core')) for m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=REPO_ROOT)
+    assert result.stdout.strip() == "False"
@@ -1,7 +1,14 @@
+import time
+import tempfile
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 from typing import Dict, Any, Tuple
 from core.screener import format_results_for_display
+from core.query import EXAMPLE_QUERY, run_query_arrow
+from core.monitor import save_screen, delete_screen, load_screens, recent_events
+from core.funnel import GRAHAM_BASE, load_screening_snapshot, compute_bitsets, funnel_report, sensitivity_grid
+from utils.export import EXPORT_FORMATS, write_export, remove_export
 
 def create_sidebar(markets: Dict[str, str], graham_criteria: Dict[str, Any]) -> Tuple[str, Dict[str, Any], bool]:
 
@@ -103,6 +110,70 @@ def create_sidebar(markets: Dict[str, str], graham_criteria: Dict[str, Any]) ->
         key=f"market_cap_slider_{st.session_state.slider_key}"
     )
     
+    st.sidebar.subheader("📜 Earnings & Dividend History")
+    
+    earnings_years_min = st.sidebar.slider(
+        "Years of Positive Earnings (Min)",
+        min_value=0,
+        max_value=10,
+        value=int(st.session_state.filters.get('earnings_years_min', 0)),
+        step=1,
+        help="Graham: 10. 0 turns the filter off.",
+        key=f"earnings_years_slider_{st.session_state.slider_key}"
+    )
+    
+    dividend_years_min = st.sidebar.slider(
+        "Years of Dividends (Min)",
+        min_value=0,
+        max_value=20,
+        value=int(st.session_state.filters.get('dividend_years_min', 0)),
+        step=1,
+        help="Graham: 20. 0 turns the filter off.",
+        key=f"dividend_years_slider_{st.session_state.slider_key}"
+    )
+    
+    earnings_growth_min = st.sidebar.slider(
+        "EPS Growth % over 10y (Min)",
+        min_value=0.0,
+        max_value=200.0,
+        value=float(st.session_state.filters.get('earnings_growth_min', 0.0)),
+        step=5.0,
+        help="Graham: 33%. 0 turns the filter off.",
+        key=f"earnings_growth_slider_{st.session_state.slider_key}"
+    )
+    
+    st.sidebar.subheader("📐 Relative to Sector Peers")
+    
+    pe_sector_pct_max = st.sidebar.slider(
+        "P/E Percentile within Sector (Max %)",
+        min_value=0,
+        max_value=100,
+        value=int(st.session_state.filters.get('pe_sector_pct_max', 100)),
+        step=5,
+        help="20 keeps the cheapest 20% of the sector across all processed markets. 100 turns the filter off.",
+        key=f"pe_sector_pct_slider_{st.session_state.slider_key}"
+    )
+    
+    pb_sector_pct_max = st.sidebar.slider(
+        "P/B Percentile within Sector (Max %)",
+        min_value=0,
+        max_value=100,
+        value=int(st.session_state.filters.get('pb_sector_pct_max', 100)),
+        step=5,
+        help="100 turns the filter off.",
+        key=f"pb_sector_pct_slider_{st.session_state.slider_key}"
+    )
+    
+    dividend_yield_sector_pct_min = st.sidebar.slider(
+        "Dividend Yield Percentile within Sector (Min %)",
+        min_value=0,
+        max_value=100,
+        value=int(st.session_state.filters.get('dividend_yield_sector_pct_min', 0)),
+        step=5,
+        help="80 keeps the top 20% payers of the sector. 0 turns the filter off.",
+        key=f"dividend_yield_sector_pct_slider_{st.session_state.slider_key}"
+    )
+    
     if st.sidebar.button("🔄 Reset to Graham Defaults", use_container_width=True):
         st.session_state.filters = graham_criteria.copy()
         st.session_state.slider_key += 1
@@ -116,14 +187,79 @@ def create_sidebar(markets: Dict[str, str], graham_criteria: Dict[str, Any]) ->
         'current_ratio_min': current_ratio_min,
         'dividend_yield_min': dividend_yield_min,
         'eps_min': eps_min,
-        'market_cap_min': market_cap_min
+        'market_cap_min': market_cap_min,
+        'earnings_years_min': earnings_years_min,
+        'dividend_years_min': dividend_years_min,
+        'earnings_growth_min': earnings_growth_min,
+        'pe_sector_pct_max': pe_sector_pct_max,
+        'pb_sector_pct_max': pb_sector_pct_max,
+        'dividend_yield_sector_pct_min': dividend_yield_sector_pct_min
     }
     
     st.session_state.filters = filters
     
     return selected_market, filters, update_market_button_clicked
 
-def display_results(df: pd.DataFrame, market_name: str):
+PAGE_SIZE_OPTIONS = [100, 500, 1000, 5000]
+
+def _get_results_cache(df: pd.DataFrame, version: int) -> Dict[str, Any]:
+    # Formatting and Arrow conversion run once per result version, not on every rerun
+    cache = st.session_state.get('results_cache')
+    if cache is None or cache['version'] != version:
+        display_df = format_results_for_display(df)
+        cache = {
+            'version': version,
+            'table': pa.Table.from_pandas(display_df, preserve_index=False),
+            'avg_pe': df['PE'].mean() if 'PE' in df.columns else 0,
+            'avg_pb': df['PB'].mean() if 'PB' in df.columns else 0,
+            'avg_div': df['DividendYield'].mean() if 'DividendYield' in df.columns else 0,
+        }
+        st.session_state.results_cache = cache
+        st.session_state.results_page = 1
+    return cache
+
+def _export_dir() -> str:
+    # One directory per session; it is removed with everything in it when the session ends or the server stops
+    if 'export_dir' not in st.session_state:
+        st.session_state.export_dir = tempfile.TemporaryDirectory(prefix="graham_exports_")
+    return st.session_state.export_dir.name
+
+def _display_export(df: pd.DataFrame, market_name: str, version: int):
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        export_format = st.selectbox("Export format", options=list(EXPORT_FORMATS.keys()), key="export_format")
+    extension, mime = EXPORT_FORMATS[export_format]
+
+    export = st.session_state.get('export_file')
+    if export is not None and (export['version'] != version or export['format'] != export_format):
+        remove_export(export['path'])
+        export = st.session_state.export_file = None
+
+    with col2:
+        if export is None:
+            # Files are only written when asked for, so reruns never pay for serialization
+            st.write("")
+            if st.button(f"📦 Prepare {export_format} Export", use_container_width=True):
+                with st.spinner(f"Writing {export_format} export..."):
+                    path = write_export(df, export_format, directory=_export_dir())
+                st.session_state.export_file = {'version': version, 'format': export_format, 'path': path, 'data': None}
+                st.rerun()
+        else:
+            # Read once, the first time the download is shown; later reruns reuse the bytes
+            if export['data'] is None:
+                with open(export['path'], 'rb') as f:
+                    export['data'] = f.read()
+                remove_export(export['path'])
+            st.write("")
+            st.download_button(
+                label=f"📥 Download Results as {export_format}",
+                data=export['data'],
+                file_name=f"graham_screener_{market_name.lower().replace(' ', '_')}.{extension}",
+                mime=mime,
+                use_container_width=True
+            )
+
+def display_results(df: pd.DataFrame, market_name: str, version: int = 0):
     st.markdown("---")
     st.subheader(f"📊 Screening Results for {market_name}")
     
@@ -131,36 +267,151 @@ def display_results(df: pd.DataFrame, market_name: str):
         st.warning("No stocks found matching your criteria.")
         return
     
-    display_df = format_results_for_display(df)
+    cache = _get_results_cache(df, version)
+    table = cache['table']
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.metric("Total Stocks", len(df))
     with col2:
-        avg_pe = df['PE'].mean() if 'PE' in df.columns else 0
-        st.metric("Avg P/E", f"{avg_pe:.2f}")
+        st.metric("Avg P/E", f"{cache['avg_pe']:.2f}")
     with col3:
-        avg_pb = df['PB'].mean() if 'PB' in df.columns else 0
-        st.metric("Avg P/B", f"{avg_pb:.2f}")
+        st.metric("Avg P/B", f"{cache['avg_pb']:.2f}")
     with col4:
-        avg_div = (df['DividendYield'].mean() if 'DividendYield' in df.columns else 0)
-        st.metric("Avg Dividend Yield", f"{avg_div:.2f}%")
+        st.metric("Avg Dividend Yield", f"{cache['avg_div']:.2f}%")
+    
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Rows per page", options=PAGE_SIZE_OPTIONS, index=0, key="results_page_size")
+    page_count = max(1, -(-table.num_rows // page_size))
+    if st.session_state.get('results_page', 1) > page_count:
+        st.session_state.results_page = page_count
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key="results_page")
+    start = (int(page) - 1) * page_size
+    with col3:
+        st.write("")
+        st.caption(f"Showing rows {start + 1}-{min(start + page_size, table.num_rows)} of {table.num_rows}")
     
+    # Zero-copy slice of the cached Arrow table; the grid virtualizes scrolling within the page
     st.dataframe(
-        display_df,
+        table.slice(start, page_size),
         use_container_width=True,
-        hide_index=True
+        hide_index=True,
+        height=min(600, 35 * (min(page_size, table.num_rows - start) + 1) + 3)
     )
     
-    csv = df.to_csv(index=False)
-    st.download_button(
-        label="📥 Download Results as CSV",
-        data=csv,
-        file_name=f"graham_screener_{market_name.lower().replace(' ', '_')}.csv",
-        mime="text/csv",
-        use_container_width=True
+    _display_export(df, market_name, version)
+
+def create_saved_screens_panel(market_code: str, filters: Dict[str, Any]):
+    st.sidebar.subheader("💾 Saved Screens & Watchlists")
+    
+    with st.sidebar.expander("Save current filters"):
+        name = st.text_input("Screen name", key="saved_screen_name")
+        watchlist = st.text_area("Watchlist tickers (optional, comma separated)", key="saved_screen_watchlist")
+        webhook = st.text_input("Webhook URL (optional)", key="saved_screen_webhook", help="Use file:///path/to/events.jsonl for a local stand-in.")
+        if st.button("💾 Save Screen", use_container_width=True):
+            if not name.strip():
+                st.warning("Please enter a screen name.")
+            else:
+                tickers = [t for t in watchlist.split(",") if t.strip()] or None
+                count = save_screen(name.strip(), market_code, filters, tickers, webhook.strip() or None)
+                st.success(f"Saved '{name.strip()}' with {count} current matches.")
+    
+    screens = load_screens()
+    for screen_name, screen in screens.items():
+        col1, col2 = st.sidebar.columns([3, 1])
+        with col1:
+            label = f"**{screen_name}** ({screen['market']})"
+            if screen.get('watchlist'):
+                label += f" · {len(screen['watchlist'])} watched"
+            st.markdown(label)
+        with col2:
+            if st.button("🗑️", key=f"delete_screen_{screen_name}"):
+                delete_screen(screen_name)
+                st.rerun()
+
+def display_screen_events(limit: int = 50):
+    events = recent_events(limit)
+    if not events:
+        return
+    with st.expander(f"🔔 Saved Screen Events (last {len(events)})"):
+        st.dataframe(pd.DataFrame(events), use_container_width=True, hide_index=True)
+
+def display_filter_funnel(market_code: str, filters: Dict[str, Any], graham_criteria: Dict[str, Any], expanded: bool = False):
+    with st.expander("🔬 Filter Funnel & Sensitivity", expanded=expanded):
+        cache_key = (market_code, tuple(sorted(filters.items())), st.session_state.get('results_version', 0))
+        cache = st.session_state.get('funnel_cache')
+        if cache is None or cache['key'] != cache_key:
+            try:
+                snapshot = load_screening_snapshot(market_code)
+            except FileNotFoundError:
+                st.info("Run the screener on this market first to see how each filter narrows the results.")
+                return
+            # Each criterion is evaluated once; the report and the grid share the bitsets
+            bitsets = compute_bitsets(snapshot, filters)
+            cache = {
+                'key': cache_key,
+                'rows': len(snapshot),
+                'report': funnel_report(snapshot, filters, bitsets),
+                'grid': sensitivity_grid(snapshot, bitsets, graham_criteria.get('ranges', {})),
+            }
+            st.session_state.funnel_cache = cache
+        
+        descriptions = graham_criteria.get('descriptions', {})
+        labels = {**descriptions, GRAHAM_BASE: "Graham base filter (fixed)"}
+        report = cache['report'].copy()
+        report['Criterion'] = report['Criterion'].map(lambda k: labels.get(k, k))
+        
+        st.markdown(f"How the current filters narrow **{cache['rows']}** processed stocks, in screening order:")
+        st.dataframe(
+            report.rename(columns={
+                'Fails': 'Stocks Failing',
+                'RemainingAfter': 'Remaining After',
+                'MatchesIfDropped': 'Matches If Dropped'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        grid = cache['grid']
+        if not grid.empty:
+            options = list(dict.fromkeys(grid['Criterion']))
+            key = st.selectbox(
+                "Sensitivity: matches across the slider range",
+                options=options,
+                format_func=lambda k: descriptions.get(k, k),
+                key="funnel_sensitivity_criterion"
+            )
+            st.line_chart(grid[grid['Criterion'] == key].set_index('Value')['Matches'])
+
+SQL_RESULT_ROW_LIMIT = 10_000
+
+def display_sql_query():
+    st.markdown("---")
+    st.subheader("🧮 SQL Query Across All Markets")
+    st.markdown(
+        "Every processed market snapshot is available as one table called `stocks`, "
+        "with an extra `Market` column. Only a single read-only SELECT statement is allowed."
     )
 
+    sql = st.text_area("Query", value=EXAMPLE_QUERY, height=180, key="sql_query")
+    if st.button("▶️ Run Query", use_container_width=True):
+        try:
+            start = time.perf_counter()
+            table = run_query_arrow(sql)
+            st.session_state.sql_result = {'table': table, 'seconds': time.perf_counter() - start}
+        except Exception as e:
+            st.session_state.sql_result = None
+            st.error(f"Query failed: {e}")
+
+    result = st.session_state.get('sql_result')
+    if result is not None:
+        table = result['table']
+        shown = min(table.num_rows, SQL_RESULT_ROW_LIMIT)
+        st.caption(f"{table.num_rows} rows in {result['seconds']:.2f}s" + (f" (showing first {shown})" if shown < table.num_rows else ""))
+        st.dataframe(table.slice(0, shown), use_container_width=True, hide_index=True)
+
 def display_how_to():
     st.markdown("---")
     st.subheader("📖 How to Use the Graham Stock Screener")
@@ -185,6 +436,8 @@ def display_how_to():
         - **Current Ratio:** Measures a company's ability to pay short-term obligations.
         - **Dividend Yield:** The annual dividend per share as a percentage of the stock's price.
         - **EPS (Earnings Per Share):** A measure of a company's profitability.
+        - **Earnings & Dividend History:** Years of unbroken positive earnings and dividends, and EPS growth over up to 10 years. They are off at 0. History is downloaded once per stock and cached.
+        - **Relative to Sector Peers:** Percentile of a stock's P/E, P/B or dividend yield within its sector, across every market you have processed. For example, P/E at 20% keeps the cheapest fifth of each sector.
     - You can adjust these sliders to match your risk tolerance.
     - Click **"Reset to Graham Defaults"** to return to the standard criteria.
 
@@ -198,10 +451,20 @@ def display_how_to():
     ### 5. Review the Results
     - The results will appear in a table.
     - You can sort the table by clicking on the column headers.
-    - To save the results, click the **"📥 Download Results as CSV"** button.
+    - Large result sets are split into pages. Use **"Rows per page"** and **"Page"** above the table to move through them.
+    - To save the results, choose CSV, Parquet or XLSX, click **"📦 Prepare Export"**, then click the **"📥 Download"** button.
+
+    ### 6. Saved Screens & Watchlists
+    - Under **"💾 Saved Screens & Watchlists"** in the sidebar, save the current filters as a named screen. You can limit it to a list of tickers.
+    - Each time a market is processed, only the stocks whose data changed are checked against your saved screens.
+    - Stocks that enter or leave a screen are logged under **"🔔 Saved Screen Events"**. They can also be sent to a webhook.
+
+    ### 7. Query Across Markets (Advanced)
+    - The **SQL Query** tab runs SQL over every market you have processed at once.
+    - All markets are one table called `stocks`, with a `Market` column to group or filter by.
 
     ### Tips
     - **Patience is Key:** The data processing step can be slow, especially for large markets. The log window will show the progress.
-    - **No Results?** If you get no results, try relaxing your filter criteria. The default Graham settings can be quite strict for modern markets.
+    - **No Results?** Open **"🔬 Filter Funnel & Sensitivity"**. It shows how many stocks fail each filter and how many would match if you dropped it. It also charts the match count across each slider's range. The default Graham settings can be quite strict for modern markets.
     - **Errors:** If a specific stock fails to load, the screener will note the error in the log and continue with the next one.
     """) 
\ No newline at end of file
@@ -38,5 +38,11 @@ def load_graham_criteria() -> Dict[str, Any]:
             "current_ratio_min": 1.5,
             "dividend_yield_min": 2.0,
             "eps_min": 0.0,
-            "market_cap_min": 500.0
+            "market_cap_min": 500.0,
+            "earnings_years_min": 0,
+            "dividend_years_min": 0,
+            "earnings_growth_min": 0.0,
+            "pe_sector_pct_max": 100,
+            "pb_sector_pct_max": 100,
+            "dividend_yield_sector_pct_min": 0
         } 
\ No newline at end of file
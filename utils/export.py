@@ -0,0 +1,68 @@
+import os
+import tempfile
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+# format -> (file extension, mime type)
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+EXPORT_CHUNK_ROWS = 10_000
+
+def _write_csv(df: pd.DataFrame, path: str, chunk_rows: int):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for start in range(0, max(len(df), 1), chunk_rows):
+            df.iloc[start:start + chunk_rows].to_csv(f, index=False, header=(start == 0))
+
+def _write_parquet(df: pd.DataFrame, path: str, chunk_rows: int):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, len(df), chunk_rows):
+            chunk = pa.Table.from_pandas(df.iloc[start:start + chunk_rows], schema=schema, preserve_index=False)
+            writer.write_table(chunk)
+
+def _write_xlsx(df: pd.DataFrame, path: str, chunk_rows: int):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Results")
+    sheet.append([str(c) for c in df.columns])
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object)
+        for row in chunk.where(chunk.notna(), None).itertuples(index=False, name=None):
+            sheet.append(list(row))
+    workbook.save(path)
+
+_WRITERS = {
+    "CSV": _write_csv,
+    "Parquet": _write_parquet,
+    "XLSX": _write_xlsx,
+}
+
+def write_export(df: pd.DataFrame, fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS, directory: Optional[str] = None) -> str:
+    """Write df to a temporary file in directory (the system temp dir by default), chunk by chunk, and return its path"""
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Choose one of: {', '.join(EXPORT_FORMATS)}")
+
+    extension, _ = EXPORT_FORMATS[fmt]
+    fd, path = tempfile.mkstemp(prefix="graham_export_", suffix=f".{extension}", dir=directory)
+    os.close(fd)
+    try:
+        _WRITERS[fmt](df, path, chunk_rows)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+def remove_export(path: str):
+    """Delete a previously written export file, ignoring files that are already gone"""
+    try:
+        os.remove(path)
+    except (FileNotFoundError, TypeError):
+        pass